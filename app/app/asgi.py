@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from core.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('ASYNC_CATALOG_READS', '1')
+# Each request runs its queries in a thread of its own, so persistent
+# connections would be left behind by every request: share a pool instead.
+os.environ.setdefault('DB_POOL_SIZE', '10')
 
-application = get_asgi_application()
+# As get_asgi_application(), with a handler streaming off the event loop.
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -38,16 +38,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'phonenumber_field',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
+    'django_filters',
     'user',
     'product',
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,16 +85,104 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Connections persist for DB_CONN_MAX_AGE seconds and are health checked
+# before reuse. With DB_POOL_SIZE set, each process instead shares a pool
+# of at most that many connections between its threads, released at the
+# end of every request, and waits up to DB_POOL_TIMEOUT seconds for one.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': (0 if DB_POOL_SIZE
+                         else int(os.environ.get('DB_CONN_MAX_AGE', 60))),
+        'CONN_HEALTH_CHECKS': (
+            os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1'
+        ),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+}
+
+# Read replicas, as comma separated DB_REPLICA_HOSTS sharing the
+# credentials of the primary. The reads of safe API requests go to one of
+# them, except for DB_REPLICA_STICKY_SECONDS after a user's last write,
+# which should exceed the replication lag. DB_REPLICA_NAME sets another
+# database name, e.g. to route to a second local database.
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')),
+        start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+# Replica the tests route reads to. It mirrors the primary in the test
+# database, and is never read from unless listed in DATABASE_REPLICAS.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'TEST': {'MIRROR': 'default'},
 }
 
+DATABASE_ROUTERS = ['core.db.routing.ReplicaRouter']
+
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'lessha'),
+    }
+}
+
+# Seconds a rendered catalog response is kept, 0 disables the cache.
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Seconds the catalog versions are kept in a process-local cache, such as
+# LocMem: the longest a process serves, or validates, catalog responses
+# that miss a write made elsewhere. Versions in a shared cache are kept.
+CATALOG_LOCAL_VERSION_TIMEOUT = int(
+    os.environ.get('CATALOG_LOCAL_VERSION_TIMEOUT', 5)
+)
+
+# Serve catalog list and detail reads with async views. Enabled by
+# app.asgi, as under WSGI every async view would need its own event loop.
+ASYNC_CATALOG_READS = os.environ.get('ASYNC_CATALOG_READS', '0') == '1'
+
+# Render JSON product lists and details from values() rows instead of
+# through the DRF serializers, for the same bytes at a fraction of the CPU.
+CATALOG_ROW_SERIALIZATION = (
+    os.environ.get('CATALOG_ROW_SERIALIZATION', '1') == '1'
+)
+
+# Responses smaller than this are sent uncompressed, as the coding
+# overhead outweighs the savings.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Seconds the compressed body of a response with a strong ETag is kept,
+# 0 compresses every response anew.
+COMPRESSION_CACHE_TIMEOUT = int(
+    os.environ.get('COMPRESSION_CACHE_TIMEOUT', CATALOG_CACHE_TIMEOUT)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -132,6 +224,19 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Uploaded images are post-processed by a background executor: 'thread'
+# runs a pool of IMAGE_PROCESSING_WORKERS threads, 'inline' runs the job
+# in the request thread once the upload is committed.
+IMAGE_PROCESSING_EXECUTOR = os.environ.get('IMAGE_PROCESSING_EXECUTOR', 'thread')
+IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', 2))
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+# Size-bounded variants generated for every processed image.
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'small': 480,
+    'medium': 960,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -141,9 +246,22 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework.authentication.TokenAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('user.authentication.CachedTokenAuthentication',),
 }
 
+# Token to user cache: entries live TOKEN_CACHE_TTL seconds in the shared
+# cache and TOKEN_CACHE_LOCAL_TTL seconds in the per-process LRU, which
+# bounds how long another process may miss an invalidation, such as a
+# deleted token or a deactivated user. The shared layer is skipped when
+# the cache backend is process-local, as LocMem is.
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_LOCAL_TTL = int(os.environ.get('TOKEN_CACHE_LOCAL_TTL', 5))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+# Bearer token required to scrape /metrics. Unset, /metrics is denied
+# unless DEBUG is set.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
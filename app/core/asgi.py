@@ -0,0 +1,57 @@
+"""
+ASGI handler streaming responses from the sync thread.
+
+Django 4.1 iterates the content of streaming responses on the event loop,
+where a generator reading the database, such as the catalog export,
+raises `SynchronousOnlyOperation`, and where any blocking read would
+stall every other request. `ASGIHandler` pulls the parts of streaming
+responses in batches with `sync_to_async`, in the thread that runs the
+sync views and owns their database connection, and sends them from the
+event loop.
+"""
+from asgiref.sync import sync_to_async
+
+from django.core.handlers import asgi
+
+
+def read_parts(parts, size):
+    """Return the next parts of an iterator, joined up to `size` bytes."""
+    batch, length = [], 0
+    for part in parts:
+        batch.append(part)
+        length += len(part)
+        if length >= size:
+            break
+
+    return b''.join(batch)
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """ASGI handler iterating streaming content off the event loop."""
+    # Bytes of streaming content pulled per trip to the sync thread.
+    stream_batch_size = 64 * 1024
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Access `__iter__`, as Django does, then leave Django an empty
+        # stream: the parts are sent before its final closing message.
+        parts = iter(response)
+        response.streaming_content = ()
+
+        async def send_parts(message):
+            if (message['type'] == 'http.response.body'
+                    and not message.get('more_body', False)):
+                while True:
+                    data = await sync_to_async(
+                        read_parts, thread_sensitive=True,
+                    )(parts, self.stream_batch_size)
+                    if not data:
+                        break
+                    for chunk, _ in self.chunk_bytes(data):
+                        await send({'type': 'http.response.body',
+                                    'body': chunk, 'more_body': True})
+            await send(message)
+
+        return await super().send_response(response, send_parts)
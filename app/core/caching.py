@@ -0,0 +1,14 @@
+"""
+Properties of the cache backends the processes may or may not share.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias='default'):
+    """Return whether a cache is private to each process, as LocMem is.
+
+    Writes to such a cache are never seen by the other processes of the
+    server, nor by management commands and shells.
+    """
+    return isinstance(caches[alias], LocMemCache)
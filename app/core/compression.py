@@ -0,0 +1,213 @@
+"""
+Compression of the responses with brotli or gzip.
+
+`CompressionMiddleware` compresses responses of at least
+COMPRESSION_MIN_SIZE bytes with the coding the client prefers among
+those it accepts: brotli, when the optional `brotli` package is
+installed, else gzip. Media that are compressed already are sent as they
+are, and streaming responses are compressed as they stream.
+
+A compressed response is another representation, so a strong ETag gets
+the suffix of its coding, e.g. `"<digest>-gzip"`; `matching_etag` lets
+the views answer preconditions naming any coding of their ETag.
+
+Views mark the responses whose body is the same for every user, e.g. the
+JSON catalog reads, as `shared_cacheable`. The compressed body of such a
+response is cached under its coded ETag: a response served from the
+catalog cache isn't compressed again on every hit.
+"""
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_etags
+
+from core.metrics import cache_requests_total
+from core.timing import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ENCODINGS = ('br', 'gzip')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Media types whose content is compressed already.
+COMPRESSED_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff', 'application/zip',
+    'application/gzip', 'application/x-gzip', 'application/x-bzip2',
+    'application/x-7z-compressed', 'application/x-xz', 'application/zstd',
+)
+# Image types that are text, and compress well.
+TEXT_IMAGE_TYPES = ('image/svg+xml',)
+
+
+def available_encodings():
+    """Return the codings the server can apply, most preferred first."""
+    return ENCODINGS if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding):
+    """Return the coding to apply given an `Accept-Encoding`, if any.
+
+    The coding with the highest quality value wins, the server preference
+    breaking ties. `*` stands for the codings not listed, and a quality
+    of 0 refuses a coding.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        param, _, value = params.strip().partition('=')
+        if param.strip().lower() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in available_encodings():
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+
+def coded_etag(etag, encoding):
+    """Return the ETag of the `encoding` coding of a strong `etag`."""
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def matching_etag(request, etag):
+    """Return the ETag of the coding of `etag` the preconditions name.
+
+    Pass the result to `get_conditional_response`: the preconditions of
+    a request name the ETag of the coding the client received, `etag`
+    itself when uncompressed.
+    """
+    named = {
+        tag.removeprefix('W/')
+        for header in ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH')
+        for tag in parse_etags(request.META.get(header, ''))
+    }
+    for encoding in ENCODINGS:
+        coded = coded_etag(etag, encoding)
+        if coded in named:
+            return coded
+
+    return etag
+
+
+def compress(content, encoding):
+    """Return `content` compressed with `encoding`."""
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Yield `chunks` compressed with `encoding`.
+
+    As Django's `compress_sequence`, the compressor is only flushed at
+    the end: output is yielded whenever it fills its window, as flushing
+    every chunk would restart the coding on small chunks, such as rows.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        compress_chunk, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        data = compress_chunk(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def is_compressible(response):
+    """Return whether compressing `response` may pay off."""
+    content_type = response.get('Content-Type', '').lower()
+    if (content_type.startswith(COMPRESSED_TYPES)
+            and not content_type.startswith(TEXT_IMAGE_TYPES)):
+        return False
+    if 'no-transform' in response.get('Cache-Control', '').lower():
+        return False
+
+    return response.streaming or len(response.content) >= \
+        settings.COMPRESSION_MIN_SIZE
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with the best coding the client accepts."""
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or \
+                not is_compressible(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.headers.get('Accept-Encoding', '')
+        )
+        if encoding is None:
+            return response
+
+        etag = response.get('ETag', '')
+        if etag.startswith('"'):
+            response['ETag'] = coded_etag(etag, encoding)
+        if response.streaming:
+            # Compressed as it is sent, past the timed phases.
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding,
+            )
+            del response['Content-Length']
+        else:
+            with timed('compress'):
+                response.content = self._compressed_content(
+                    request, response, encoding,
+                )
+            response['Content-Length'] = str(len(response.content))
+        response['Content-Encoding'] = encoding
+
+        return response
+
+    @staticmethod
+    def _compressed_content(request, response, encoding):
+        """Return the compressed content, from the cache if possible.
+
+        Only reads are cached, under their coded ETag: a write response
+        carries the ETag of the read of its URL, without carrying its body.
+        """
+        etag = response.get('ETag', '')
+        if (request.method != 'GET' or response.status_code != 200
+                or not getattr(response, 'shared_cacheable', False)
+                or not etag.startswith('"')
+                or not settings.COMPRESSION_CACHE_TIMEOUT):
+            return compress(response.content, encoding)
+
+        key = f'compressed-response:{hashlib.md5(etag.encode()).hexdigest()}'
+        content = cache.get(key)
+        cache_requests_total.labels(
+            'compressed-response', 'miss' if content is None else 'hit',
+        ).inc()
+        if content is None:
+            content = compress(response.content, encoding)
+            cache.set(key, content, settings.COMPRESSION_CACHE_TIMEOUT)
+
+        return content
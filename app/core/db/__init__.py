@@ -0,0 +1,3 @@
+"""
+Database backend of the app, set as `ENGINE` in the settings.
+"""
@@ -0,0 +1,104 @@
+"""
+PostgreSQL backend counting its connections, with an optional pool.
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.timing import record_query
+
+from .pool import get_pool, stats
+
+
+# Isolation level of the connections of each pool, as found by the
+# wrapper that opened them, for the wrappers reusing them.
+_isolation_levels = {}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend borrowing its connections from a pool.
+
+    With `POOL = {'SIZE': n, 'TIMEOUT': seconds}` in the database
+    settings, connections come from a process-wide pool of at most `n`
+    connections, and closing one gives it back instead of disconnecting.
+    Threaded and ASGI workers then share a bounded set of connections,
+    each request paying for an acquire rather than a connect. Reused
+    connections are pinged first when `CONN_HEALTH_CHECKS` is set.
+
+    Without a pool, this is the stock backend. Either way, connections
+    opened and closed are counted in `core.db.pool.stats`, and queries
+    are timed for the current request by `core.timing`.
+    """
+    _pool = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(record_query)
+
+    def _open(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        stats.incr('opened')
+        return connection
+
+    @staticmethod
+    def _disconnect(connection):
+        stats.incr('closed')
+        connection.close()
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except base.Database.Error:
+            return False
+
+        return True
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('SIZE'):
+            self._pool = None
+            return self._open(conn_params)
+
+        key = (self.alias, repr(sorted(conn_params.items())))
+        self._pool = get_pool(key, options['SIZE'],
+                              options.get('TIMEOUT', 30), self._disconnect)
+        check = None
+        if self.settings_dict['CONN_HEALTH_CHECKS']:
+            check = self._ping
+
+        def connect():
+            connection = self._open(conn_params)
+            _isolation_levels[key] = self.isolation_level
+            return connection
+
+        connection = self._pool.acquire(connect, check=check)
+        self.isolation_level = _isolation_levels[key]
+
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        if self._pool is None:
+            with self.wrap_database_errors:
+                return self._disconnect(self.connection)
+
+        # A connection closed inside an atomic block stays referenced by
+        # this wrapper until the block exits, so it can't be shared.
+        connection = self.connection
+        discard = bool(connection.closed) or self.in_atomic_block
+        if not discard and self.errors_occurred:
+            discard = not self.is_usable()
+        if (not discard and connection.get_transaction_status()
+                != extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except base.Database.Error:
+                discard = True
+
+        with self.wrap_database_errors:
+            self._pool.release(connection, discard=discard)
@@ -0,0 +1,169 @@
+"""
+In-process pool of database connections, and connection counters.
+"""
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError
+
+from core import metrics
+
+
+class PoolTimeout(OperationalError):
+    """No pooled connection was released within the acquire timeout."""
+
+
+class ConnectionStats:
+    """Thread-safe counters of the connection lifecycle of a process.
+
+    Every counter is also exported on /metrics, by `core.metrics`.
+    """
+    FIELDS = ('opened', 'closed', 'reused', 'waits', 'wait_seconds',
+              'timeouts')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS, 0)
+        self._exported = {
+            'opened': metrics.db_connections_total.labels('opened'),
+            'closed': metrics.db_connections_total.labels('closed'),
+            'reused': metrics.db_connections_total.labels('reused'),
+            'waits': metrics.db_pool_waits_total,
+            'wait_seconds': metrics.db_pool_wait_seconds,
+            'timeouts': metrics.db_pool_timeouts_total,
+        }
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._values[name] += amount
+        self._exported[name].inc(amount)
+
+    def snapshot(self):
+        """Return the current value of every counter."""
+        with self._lock:
+            return dict(self._values)
+
+
+stats = ConnectionStats()
+
+# Connections of the pools of this process, by state.
+in_use_gauge = metrics.db_pool_connections.labels('in_use')
+idle_gauge = metrics.db_pool_connections.labels('idle')
+
+
+class ConnectionPool:
+    """Bounded set of connections shared by the threads of a process.
+
+    At most `size` connections are open at once. Acquiring while all of
+    them are in use waits up to `timeout` seconds for one to be released,
+    then raises `PoolTimeout`. Idle connections are reused most recently
+    released first, and `close` is called on the discarded ones.
+    """
+
+    def __init__(self, size, timeout, close):
+        self.size = size
+        self.timeout = timeout
+        self._close = close
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _reserve(self):
+        """Wait for a free slot and return an idle connection, if any."""
+        started = None
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                now = time.monotonic()
+                if started is None:
+                    started = now
+                    stats.incr('waits')
+                remaining = started + self.timeout - now
+                if remaining <= 0:
+                    stats.incr('timeouts')
+                    stats.incr('wait_seconds', now - started)
+                    raise PoolTimeout(
+                        f'No connection available within {self.timeout}s '
+                        f'(pool size {self.size}).'
+                    )
+                self._cond.wait(remaining)
+
+            if started is not None:
+                stats.incr('wait_seconds', time.monotonic() - started)
+            self._in_use += 1
+            in_use_gauge.inc()
+            if not self._idle:
+                return None
+            idle_gauge.dec()
+            return self._idle.pop()
+
+    def _unreserve(self):
+        with self._cond:
+            self._in_use -= 1
+            in_use_gauge.dec()
+            self._cond.notify()
+
+    def acquire(self, connect, check=None):
+        """Return an idle connection, or one opened with `connect`.
+
+        Idle connections for which `check` returns false are discarded.
+        """
+        connection = self._reserve()
+        if connection is not None:
+            if check is None or check(connection):
+                stats.incr('reused')
+                return connection
+            self._close(connection)
+
+        try:
+            return connect()
+        except BaseException:
+            self._unreserve()
+            raise
+
+    def release(self, connection, discard=False):
+        """Give a connection back, or close it when `discard` is set."""
+        if discard:
+            self._close(connection)
+        with self._cond:
+            self._in_use -= 1
+            in_use_gauge.dec()
+            if not discard:
+                self._idle.append(connection)
+                idle_gauge.inc()
+            self._cond.notify()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            idle_gauge.dec(len(idle))
+        for connection in idle:
+            self._close(connection)
+
+    def usage(self):
+        """Return the number of connections in use and idle."""
+        with self._cond:
+            return {'in_use': self._in_use, 'idle': len(self._idle)}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, size, timeout, close):
+    """Return the pool registered under `key`, creating it if needed."""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(size, timeout, close)
+
+        return pool
+
+
+def close_pools():
+    """Close the idle connections of every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
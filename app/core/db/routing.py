@@ -0,0 +1,106 @@
+"""
+Routing of the reads of safe API requests to the read replicas.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+STICKY_KEY = 'db-primary:{}'
+
+# Replica the reads of the current request go to, if any.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def stick_to_primary(user):
+    """Send the reads of `user` to the primary for the sticky window."""
+    if settings.DATABASE_REPLICAS and settings.DB_REPLICA_STICKY_SECONDS:
+        cache.set(STICKY_KEY.format(user.pk), True,
+                  settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user):
+    """Return whether `user` wrote within the sticky window."""
+    return bool(cache.get(STICKY_KEY.format(user.pk)))
+
+
+def choose_replica():
+    """Return the alias of the replica to read from."""
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def set_read_alias(alias):
+    """Send the reads of the current request to `alias`, None for primary."""
+    _read_alias.set(alias)
+
+
+def may_be_stale(written_at):
+    """Return whether reads may not see yet a write made at `written_at`.
+
+    `written_at` is a time in nanoseconds, like the catalog versions.
+    """
+    return (_read_alias.get() is not None
+            and time.time_ns() - written_at
+            < settings.DB_REPLICA_STICKY_SECONDS * 10 ** 9)
+
+
+class ReplicaRouter:
+    """Database router reading from the replica chosen for the request.
+
+    Writes, and the reads of requests not routed to a replica, go to the
+    primary. Replicas are never migrated, they follow the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
+
+
+class ReplicaReadMixin:
+    """Read from a replica in the safe requests of a view.
+
+    A user who made a write keeps reading from the primary for
+    `DB_REPLICA_STICKY_SECONDS`, so they see their own writes even though
+    the replicas lag behind.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        set_read_alias(None)
+        self._writer = None
+        super().initial(request, *args, **kwargs)
+
+        user = request.user
+        if request.method not in SAFE_METHODS:
+            if user.is_authenticated:
+                self._writer = user
+        elif settings.DATABASE_REPLICAS and not (user.is_authenticated
+                                                 and is_sticky(user)):
+            set_read_alias(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        set_read_alias(None)
+        if getattr(self, '_writer', None) is not None:
+            stick_to_primary(self._writer)
+
+        return super().finalize_response(request, response, *args, **kwargs)
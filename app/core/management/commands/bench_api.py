@@ -0,0 +1,456 @@
+"""
+Django command to benchmark every API endpoint in-process.
+"""
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import math
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import (
+    Product,
+    Product_type,
+    Rating,
+    Resource,
+    Tag,
+)
+from product import urls as product_urls
+from user import urls as user_urls
+
+
+PASSWORD = 'benchpass123'
+
+
+def percentile(durations, percent):
+    """Return the nearest-rank percentile, in ms, of sorted durations."""
+    index = max(0, math.ceil(percent / 100 * len(durations)) - 1)
+    return round(durations[index] * 1000, 3)
+
+
+def route_names():
+    """Return the names of every route of the product and user APIs."""
+    return sorted(
+        [f'product:{pattern.name}' for pattern in product_urls.router.urls]
+        + [f'user:{pattern.name}' for pattern in user_urls.urlpatterns]
+    )
+
+
+def jpeg_file(name='image.jpg'):
+    """Create and return a small uploaded JPEG image."""
+    data = BytesIO()
+    Image.new('RGB', (640, 480), 'teal').save(data, format='JPEG')
+    return SimpleUploadedFile(name, data.getvalue(), 'image/jpeg')
+
+
+def git_revision():
+    """Return the commit of the working tree, if any."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to measure the cost of every API endpoint."""
+    help = ('Build a catalog fixture in a throwaway test database and '
+            'report latency percentiles, queries and allocated memory of '
+            'every product and user API route.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=1000,
+            help='Number of products of the fixture, which sizes the rest.',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed requests per endpoint.',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            default=[],
+            help='Only run endpoints whose name contains this, repeatable.',
+        )
+        parser.add_argument(
+            '--response-cache',
+            action='store_true',
+            help='Keep the catalog response cache enabled.',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the test database and its fixture between runs.',
+        )
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'],
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(
+                        CATALOG_CACHE_TIMEOUT=(
+                            300 if options['response_cache'] else 0
+                        ),
+                        DATABASE_REPLICAS=[],
+                        IMAGE_PROCESSING_EXECUTOR='inline',
+                        MEDIA_ROOT=media_root,
+                    ):
+                cache.clear()
+                fixture = self._build_fixture(options['products'])
+                results = self._run(fixture, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'revision': git_revision(),
+            'products': options['products'],
+            'iterations': options['iterations'],
+            'response_cache': options['response_cache'],
+            'endpoints': results,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._write_table(results)
+
+    def _build_fixture(self, size):
+        """Create a catalog of `size` products, unless already there."""
+        User = get_user_model()
+        if not Product.objects.exists():
+            with transaction.atomic():
+                self._create_catalog(size)
+            call_command('rebuild_rating_aggregates', stdout=StringIO())
+
+        user = User.objects.get(email='bench-user@example.com')
+        staff = User.objects.get(email='bench-staff@example.com')
+
+        return {
+            'anonymous': APIClient(),
+            'user': self._client(user),
+            'staff': self._client(staff),
+            'user_obj': user,
+            'product': Product.objects.order_by('id').first(),
+            'type': Product_type.objects.order_by('id').first(),
+            'tag': Tag.objects.order_by('id').first(),
+            'resource': Resource.objects.order_by('id').first(),
+            'rating': Rating.objects.filter(user=user).order_by('id').first(),
+        }
+
+    @staticmethod
+    def _client(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    @staticmethod
+    def _create_catalog(size):
+        """Insert products with tags, types, resources and ratings."""
+        User = get_user_model()
+        types = Product_type.objects.bulk_create(
+            Product_type(name=f'Type {i}') for i in range(max(size // 100, 5))
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Tag {i}') for i in range(max(size // 20, 10))
+        )
+        resources = Resource.objects.bulk_create(
+            Resource(name=f'Resource {i}', price=Decimal(i % 1000) / 10)
+            for i in range(max(size // 50, 5))
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', price=Decimal(i % 100000) / 100,
+                    description=f'Description of product {i}.')
+            for i in range(size)
+        )
+
+        Product.types.through.objects.bulk_create(
+            Product.types.through(product=product,
+                                  product_type=types[i % len(types)])
+            for i, product in enumerate(products)
+        )
+        Product.tags.through.objects.bulk_create(
+            Product.tags.through(product=product, tag=tags[(i + j) % len(tags)])
+            for i, product in enumerate(products) for j in range(2)
+        )
+        Product.resources.through.objects.bulk_create(
+            Product.resources.through(product=product,
+                                      resource=resources[i % len(resources)])
+            for i, product in enumerate(products)
+        )
+
+        User.objects.create_user(email='bench-user@example.com',
+                                 password=PASSWORD)
+        User.objects.create_superuser(email='bench-staff@example.com',
+                                      password=PASSWORD)
+        users = User.objects.bulk_create(
+            User(email=f'rater{i}@example.com')
+            for i in range(max(size // 20, 10))
+        )
+        raters = [*users, User.objects.get(email='bench-user@example.com')]
+        Rating.objects.bulk_create(
+            Rating(user=user, product=products[(i * 10 + j) % len(products)],
+                   value=1 + (i + j) % 5)
+            for i, user in enumerate(raters) for j in range(10)
+        )
+
+    def _endpoints(self, fixture):
+        """Return the (name, route, client, method, request) of each case.
+
+        `request` takes the iteration number and returns the URL and the
+        request arguments. It runs outside of the measure, so it may
+        create the objects a request works on.
+        """
+        product = fixture['product']
+        rating = fixture['rating']
+        # Names created by this run, unique across runs on a kept database.
+        run = time.time_ns()
+        cases = [
+            ('api-root', 'product:api-root', 'anonymous', 'get',
+             lambda i: (reverse('product:api-root'), {})),
+            ('products-list', 'product:product-list', 'anonymous', 'get',
+             lambda i: (reverse('product:product-list'), {})),
+            ('products-list-filtered', 'product:product-list', 'anonymous',
+             'get',
+             lambda i: (reverse('product:product-list'), {'data': {
+                 'tags': fixture['tag'].id, 'price_min': 1,
+             }})),
+            ('products-search', 'product:product-list', 'anonymous', 'get',
+             lambda i: (reverse('product:product-list'),
+                        {'data': {'search': 'product'}})),
+            ('products-detail', 'product:product-detail', 'anonymous', 'get',
+             lambda i: (reverse('product:product-detail', args=[product.id]),
+                        {})),
+            ('products-create', 'product:product-list', 'staff', 'post',
+             lambda i: (reverse('product:product-list'), {'format': 'json',
+                        'data': {'name': f'New product {run}-{i}', 'price': '9.99',
+                                 'tags': [{'name': 'Tag 1'}]}})),
+            ('products-update', 'product:product-detail', 'staff', 'put',
+             lambda i: (reverse('product:product-detail', args=[product.id]),
+                        {'format': 'json',
+                         'data': {'name': product.name, 'price': '1.00',
+                                  'tags': [{'name': 'Tag 1'}]}})),
+            ('products-partial-update', 'product:product-detail', 'staff',
+             'patch',
+             lambda i: (reverse('product:product-detail', args=[product.id]),
+                        {'format': 'json', 'data': {'price': '2.00'}})),
+            ('products-destroy', 'product:product-detail', 'staff', 'delete',
+             lambda i: (reverse('product:product-detail', args=[
+                 Product.objects.create(name=f'Doomed {run}-{i}',
+                                        price=Decimal('1')).id,
+             ]), {})),
+            ('products-export', 'product:product-export', 'anonymous', 'get',
+             lambda i: (reverse('product:product-export'),
+                        {'HTTP_ACCEPT': 'application/x-ndjson'})),
+            ('products-import', 'product:product-bulk-import', 'staff',
+             'post',
+             lambda i: (reverse('product:product-bulk-import'), {
+                 'format': 'json',
+                 'data': [{'name': f'Imported {run}-{i}-{j}', 'price': '3.00',
+                           'tags': [{'name': 'Tag 2'}]} for j in range(50)],
+             })),
+            ('products-upload-image', 'product:product-upload-image',
+             'staff', 'post',
+             lambda i: (reverse('product:product-upload-image',
+                                args=[product.id]),
+                        {'format': 'multipart',
+                         'data': {'image': jpeg_file()}})),
+            ('ratings-list', 'product:rating-list', 'anonymous', 'get',
+             lambda i: (reverse('product:rating-list'), {})),
+            ('ratings-create', 'product:rating-list', 'user', 'post',
+             lambda i: (reverse('product:rating-list'),
+                        {'data': {'product': product.id,
+                                  'value': 1 + i % 5}})),
+            ('ratings-partial-update', 'product:rating-detail', 'user',
+             'patch',
+             lambda i: (reverse('product:rating-detail', args=[rating.id]),
+                        {'format': 'json', 'data': {'value': 1 + i % 5}})),
+            ('ratings-bulk', 'product:rating-bulk-rate', 'user', 'post',
+             lambda i: (reverse('product:rating-bulk-rate'), {
+                 'format': 'json',
+                 'data': [{'product': product.id + j, 'value': 1 + i % 5}
+                          for j in range(20)],
+             })),
+            ('resources-upload-image', 'product:resource-upload-image',
+             'staff', 'post',
+             lambda i: (reverse('product:resource-upload-image',
+                                args=[fixture['resource'].id]),
+                        {'format': 'multipart',
+                         'data': {'image': jpeg_file()}})),
+            ('user-create', 'user:create', 'anonymous', 'post',
+             lambda i: (reverse('user:create'),
+                        {'data': {'email': f'new{run}-{i}@example.com',
+                                  'password': PASSWORD, 'name': 'New'}})),
+            ('user-token', 'user:token', 'anonymous', 'post',
+             lambda i: (reverse('user:token'),
+                        {'data': {'email': fixture['user_obj'].email,
+                                  'password': PASSWORD}})),
+            ('user-me', 'user:me', 'user', 'get',
+             lambda i: (reverse('user:me'), {})),
+            ('user-me-partial-update', 'user:me', 'user', 'patch',
+             lambda i: (reverse('user:me'),
+                        {'format': 'json', 'data': {'name': f'User {i}'}})),
+        ]
+
+        for prefix, basename, model, instance in (
+            ('product-types', 'product_type', Product_type, fixture['type']),
+            ('tags', 'tag', Tag, fixture['tag']),
+            ('resources', 'resource', Resource, fixture['resource']),
+        ):
+            cases.extend(self._crud_endpoints(prefix, basename, model,
+                                              instance, run))
+
+        return cases
+
+    @staticmethod
+    def _crud_endpoints(prefix, basename, model, instance, run):
+        """Return the cases of a simple catalog viewset."""
+        list_route = f'product:{basename}-list'
+        detail_route = f'product:{basename}-detail'
+        extra = {'price': '1.00'} if model is Resource else {}
+
+        def detail_url(pk):
+            return reverse(detail_route, args=[pk])
+
+        return [
+            (f'{prefix}-list', list_route, 'anonymous', 'get',
+             lambda i: (reverse(list_route), {})),
+            (f'{prefix}-detail', detail_route, 'anonymous', 'get',
+             lambda i: (detail_url(instance.id), {})),
+            (f'{prefix}-create', list_route, 'staff', 'post',
+             lambda i: (reverse(list_route), {
+                 'format': 'json',
+                 'data': {'name': f'New {basename} {run}-{i}', **extra},
+             })),
+            (f'{prefix}-partial-update', detail_route, 'staff', 'patch',
+             lambda i: (detail_url(instance.id), {
+                 'format': 'json', 'data': {'name': f'Renamed {run}-{i}'},
+             })),
+            (f'{prefix}-destroy', detail_route, 'staff', 'delete',
+             lambda i: (detail_url(
+                 model.objects.create(name=f'Doomed {basename} {run}-{i}',
+                                      **extra).id
+             ), {})),
+        ]
+
+    def _run(self, fixture, options):
+        """Measure every selected endpoint and return its results."""
+        cases = self._endpoints(fixture)
+        missing = set(route_names()) - {case[1] for case in cases}
+        if missing:
+            self.stderr.write(f'Routes not benchmarked: '
+                              f'{", ".join(sorted(missing))}')
+
+        results = []
+        for name, route, client, method, request in cases:
+            if options['endpoint'] and not any(
+                    part in name for part in options['endpoint']):
+                continue
+            results.append(self._measure(
+                name, getattr(fixture[client], method), request,
+                options['iterations'],
+            ))
+
+        return results
+
+    @staticmethod
+    def _send(send, request, iteration):
+        """Prepare and send one request, return the response and body."""
+        url, kwargs = request(iteration)
+        started = time.perf_counter()
+        response = send(url, **kwargs)
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+        else:
+            body = response.content
+
+        return time.perf_counter() - started, response, body
+
+    def _measure(self, name, send, request, iterations):
+        """Return the latency, queries and memory of an endpoint.
+
+        One untimed request warms up the caches of the process, then the
+        requests are timed, and a last one is traced to measure its peak
+        of allocated memory.
+        """
+        self._send(send, request, 0)
+
+        durations = []
+        statuses = set()
+        queries = []
+        for iteration in range(1, iterations + 1):
+            with CaptureQueriesContext(connection) as captured:
+                duration, response, body = self._send(send, request,
+                                                      iteration)
+            durations.append(duration)
+            statuses.add(response.status_code)
+            queries.append(len(captured))
+
+        tracemalloc.start()
+        try:
+            self._send(send, request, iterations + 1)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        durations.sort()
+        return {
+            'name': name,
+            'status': sorted(statuses),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'mean_ms': round(statistics.fmean(durations) * 1000, 3),
+            'queries': max(queries),
+            'peak_kib': round(peak / 1024, 1),
+            'bytes': len(body),
+        }
+
+    def _write_table(self, results):
+        columns = ('name', 'status', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'queries', 'peak_kib', 'bytes')
+        rows = [columns] + [
+            tuple(','.join(map(str, result[column]))
+                  if column == 'status' else str(result[column])
+                  for column in columns)
+            for result in results
+        ]
+        widths = [max(len(row[i]) for row in rows)
+                  for i in range(len(columns))]
+        for row in rows:
+            self.stdout.write('  '.join(value.ljust(width) for value, width
+                                        in zip(row, widths)).rstrip())
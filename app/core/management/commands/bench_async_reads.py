@@ -0,0 +1,207 @@
+"""
+Django command to compare catalog read throughput under WSGI and ASGI.
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from core.asgi import ASGIHandler
+
+
+def summarize(handler, durations, errors, elapsed):
+    """Return the throughput and latency percentiles of a run."""
+    durations = sorted(durations)
+    quantiles = statistics.quantiles(durations, n=100) if len(durations) > 1 \
+        else durations * 99
+
+    return {
+        'handler': handler,
+        'requests': len(durations),
+        'errors': errors,
+        'requests_per_second': round(len(durations) / elapsed, 1),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the catalog read path."""
+    help = ('Serve catalog reads to many slow clients in-process through the '
+            'WSGI handler and the ASGI handler, and compare throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='/api/product/products/?page_size=20',
+            help='Path and query string to read.',
+        )
+        parser.add_argument(
+            '--handler',
+            choices=('both', 'wsgi', 'asgi'),
+            default='both',
+            help='Handler to benchmark; "both" runs each in a subprocess.',
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=100,
+            help='Number of clients connected at once.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Threads of the WSGI worker.',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.05,
+            help='Seconds each client takes to send its request.',
+        )
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['handler'] == 'both':
+            results = [self._run_subprocess(handler, options)
+                       for handler in ('wsgi', 'asgi')]
+        else:
+            results = [self._run(options['handler'], options)]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        for result in results:
+            self.stdout.write(
+                '{handler}: {requests_per_second} req/s, p50 {p50_ms}ms, '
+                'p95 {p95_ms}ms, {errors} errors'.format(**result)
+            )
+
+    def _run_subprocess(self, handler, options):
+        """Run one handler in a process with the matching read path."""
+        command = [
+            sys.executable, sys.argv[0], 'bench_async_reads', '--json',
+            '--handler', handler,
+            '--url', options['url'],
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--workers', str(options['workers']),
+            '--client-delay', str(options['client_delay']),
+        ]
+        env = {**os.environ,
+               'ASYNC_CATALOG_READS': '1' if handler == 'asgi' else '0'}
+        output = subprocess.run(command, env=env, check=True,
+                                capture_output=True, text=True).stdout
+
+        return json.loads(output)[0]
+
+    def _run(self, handler, options):
+        """Run one handler in this process."""
+        if settings.ASYNC_CATALOG_READS != (handler == 'asgi'):
+            raise CommandError(
+                f'Set ASYNC_CATALOG_READS={int(handler == "asgi")} to '
+                f'benchmark the {handler} handler.'
+            )
+
+        url = urlsplit(options['url'])
+        if handler == 'wsgi':
+            return self._run_wsgi(url, options)
+
+        return asyncio.run(self._run_asgi(url, options))
+
+    def _run_wsgi(self, url, options):
+        """Serve the clients from a pool of worker threads.
+
+        A slow client holds its worker thread while sending its request.
+        """
+        app = WSGIHandler()
+        delay = options['client_delay']
+
+        def request():
+            started = time.perf_counter()
+            time.sleep(delay)
+            statuses = []
+            response = app({
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': url.path,
+                'QUERY_STRING': url.query,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+            }, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - started, statuses[0][:3] != '200'
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['workers']) as pool:
+            outcomes = list(pool.map(lambda _: request(),
+                                     range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        return summarize('wsgi', [duration for duration, _ in outcomes],
+                         sum(error for _, error in outcomes), elapsed)
+
+    async def _run_asgi(self, url, options):
+        """Serve the clients concurrently on the event loop.
+
+        A slow client only holds a pending `receive` while sending.
+        """
+        app = ASGIHandler()
+        delay = options['client_delay']
+        slots = asyncio.Semaphore(options['concurrency'])
+
+        async def request():
+            async with slots:
+                started = time.perf_counter()
+                statuses = []
+
+                async def receive():
+                    await asyncio.sleep(delay)
+                    return {'type': 'http.request', 'body': b'',
+                            'more_body': False}
+
+                async def send(message):
+                    if message['type'] == 'http.response.start':
+                        statuses.append(message['status'])
+
+                await app({
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': 'GET',
+                    'scheme': 'http',
+                    'path': url.path,
+                    'raw_path': url.path.encode(),
+                    'query_string': url.query.encode(),
+                    'headers': [(b'host', b'localhost')],
+                    'server': ('localhost', 80),
+                    'client': ('127.0.0.1', 0),
+                }, receive, send)
+                return time.perf_counter() - started, statuses[0] != 200
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(request() for _ in range(options['requests']))
+        )
+        elapsed = time.perf_counter() - started
+
+        return summarize('asgi', [duration for duration, _ in outcomes],
+                         sum(error for _, error in outcomes), elapsed)
@@ -0,0 +1,125 @@
+"""
+Django command to compare the CPU cost of rendering products through the
+DRF serializers and through rows.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from core.management.commands.bench_api import (
+    Command as BenchApiCommand,
+    git_revision,
+)
+from core.models import Product
+from product.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    """Django command to measure the CPU time of product rendering."""
+    help = ('Build a catalog fixture in a throwaway test database and '
+            'report the CPU time to fetch and render 1,000 products as the '
+            'list and detail endpoints do, with and without rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=1000,
+            help='Number of products rendered per measure.',
+        )
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Measures per case, the best one is kept.')
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the test database and its fixture between runs.',
+        )
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'],
+        )
+        try:
+            if not Product.objects.exists():
+                with transaction.atomic():
+                    BenchApiCommand._create_catalog(options['products'])
+            results = [
+                self._compare(action, options['products'], options['repeat'])
+                for action in ('list', 'retrieve')
+            ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'revision': git_revision(),
+                'products': options['products'],
+                'results': results,
+            }, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f'{result["action"]}: {result["serializers_ms"]} ms with '
+                f'serializers, {result["rows_ms"]} ms with rows per 1,000 '
+                f'products ({result["reduction_percent"]}% less CPU)'
+            )
+
+    @staticmethod
+    def _view(action):
+        """Return the product view of a JSON request for `action`."""
+        request = Request(RequestFactory().get('/'))
+        request.accepted_renderer = JSONRenderer()
+        request.accepted_media_type = JSONRenderer.media_type
+
+        return ProductViewSet(action=action, request=request,
+                              format_kwarg=None, args=(), kwargs={})
+
+    def _measure(self, action, size, repeat):
+        """Return the best CPU time, in seconds, of fetching and rendering."""
+        best = None
+        for _ in range(repeat):
+            view = self._view(action)
+            started = time.process_time()
+            products = list(view.get_queryset().order_by('id')[:size])
+            serializer = view.get_serializer(products, many=True)
+            JSONRenderer().render(serializer.data)
+            elapsed = time.process_time() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best, len(products)
+
+    def _compare(self, action, size, repeat):
+        """Compare the serializers and the rows for one action."""
+        timings = {}
+        for rows in (False, True):
+            with override_settings(CATALOG_ROW_SERIALIZATION=rows):
+                elapsed, count = self._measure(action, size, repeat)
+            timings[rows] = round(elapsed / count * 1000 * 1000, 2)
+
+        return {
+            'action': action,
+            'serializers_ms': timings[False],
+            'rows_ms': timings[True],
+            'reduction_percent': round(
+                (1 - timings[True] / timings[False]) * 100, 1
+            ),
+        }
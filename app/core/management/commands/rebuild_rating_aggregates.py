@@ -0,0 +1,55 @@
+"""
+Django command to rebuild the product rating aggregates from scratch.
+"""
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from core.models import Product, Rating
+from core.versioning import bump_versions
+
+
+class Command(BaseCommand):
+    """Django command to recompute product rating aggregates."""
+    help = 'Recompute rating_avg, rating_count and rating_sum of products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'product_ids',
+            nargs='*',
+            type=int,
+            help='Only rebuild these products (default: all products).',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        products = Product.objects.all()
+        if options['product_ids']:
+            products = products.filter(pk__in=options['product_ids'])
+
+        ratings = (Rating.objects.filter(product=models.OuterRef('pk'))
+                   .order_by()
+                   .values('product'))
+        count = Coalesce(
+            models.Subquery(ratings.annotate(c=models.Count('id')).values('c')),
+            0,
+        )
+        total = Coalesce(
+            models.Subquery(ratings.annotate(s=models.Sum('value')).values('s')),
+            0,
+        )
+
+        with transaction.atomic():
+            updated = products.update(
+                rating_count=count,
+                rating_sum=total,
+            )
+            products.update(
+                rating_avg=(Cast('rating_sum', models.FloatField())
+                            / NullIf('rating_count', 0)),
+            )
+            bump_versions(Product)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating aggregates for {updated} products.'
+        ))
@@ -0,0 +1,139 @@
+"""
+Prometheus metrics of the API, exposed at /metrics.
+
+Under several worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers, before they start: each process then
+writes its samples to files there, and /metrics aggregates them whatever
+the process answering the scrape. The files of a dead worker should be
+marked with `prometheus_client.multiprocess.mark_process_dead(pid)`,
+e.g. from the `child_exit` hook of gunicorn.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+requests_total = Counter(
+    'http_requests_total',
+    'Requests answered, by route name, method and status code.',
+    ['route', 'method', 'status'],
+)
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'Time to answer a request, by route name and method.',
+    ['route', 'method'],
+)
+request_queries = Histogram(
+    'http_request_db_queries',
+    'Database queries run by a request, by route name and method.',
+    ['route', 'method'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+request_db_duration = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database queries by a request, by route name.',
+    ['route', 'method'],
+)
+request_phase_duration = Histogram(
+    'http_request_phase_duration_seconds',
+    'Time spent serializing, rendering and compressing a request, by '
+    'route name, method and phase.',
+    ['route', 'method', 'phase'],
+)
+cache_requests_total = Counter(
+    'cache_requests_total',
+    'Cache lookups, by cache and result (hit, miss or not_modified).',
+    ['cache', 'result'],
+)
+image_upload_bytes = Histogram(
+    'image_upload_bytes',
+    'Size of the uploaded images, by model.',
+    ['model'],
+    buckets=tuple(2 ** exp * 1024 for exp in range(4, 16, 2)),
+)
+image_processing_duration = Histogram(
+    'image_processing_duration_seconds',
+    'Time to process an uploaded image, by model and outcome.',
+    ['model', 'outcome'],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+auth_failures_total = Counter(
+    'auth_failures_total',
+    'Failed authentications, by reason (token or credentials).',
+    ['reason'],
+)
+db_connections_total = Counter(
+    'db_connections_total',
+    'Database connections, by event (opened, closed or reused).',
+    ['event'],
+)
+db_pool_waits_total = Counter(
+    'db_pool_waits_total',
+    'Acquires that waited for a pooled connection to be released.',
+)
+db_pool_wait_seconds = Counter(
+    'db_pool_wait_seconds',
+    'Time spent waiting for a pooled connection to be released.',
+)
+db_pool_timeouts_total = Counter(
+    'db_pool_timeouts_total',
+    'Acquires that gave up waiting for a pooled connection.',
+)
+db_pool_connections = Gauge(
+    'db_pool_connections',
+    'Connections of the database pools, by state (in_use or idle).',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+
+
+def observe_request(route, method, status, timings, duration):
+    """Record a request and its database work."""
+    route = route or UNMATCHED_ROUTE
+    requests_total.labels(route, method, str(status)).inc()
+    request_duration.labels(route, method).observe(duration)
+    request_queries.labels(route, method).observe(timings.queries)
+    request_db_duration.labels(route, method).observe(timings.db)
+    for phase, duration in timings.phases.items():
+        request_phase_duration.labels(route, method, phase).observe(duration)
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Expose the metrics in the Prometheus text format.
+
+    Scrapers must send METRICS_TOKEN as a bearer token. Without a token
+    configured, the metrics are only exposed with DEBUG set.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                 f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,53 @@
+# Generated by Django 4.1.13 on 2026-10-17 02:18
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    """Fill the new aggregate columns from the existing ratings."""
+    Product = apps.get_model('core', 'Product')
+    Rating = apps.get_model('core', 'Rating')
+    ratings = (Rating.objects.filter(product=models.OuterRef('pk'))
+               .order_by()
+               .values('product'))
+    count = Coalesce(
+        models.Subquery(ratings.annotate(c=models.Count('id')).values('c')),
+        0,
+    )
+    total = Coalesce(
+        models.Subquery(ratings.annotate(s=models.Sum('value')).values('s')),
+        0,
+    )
+    Product.objects.update(rating_count=count, rating_sum=total)
+    Product.objects.update(
+        rating_avg=(Cast('rating_sum', models.FloatField())
+                    / NullIf('rating_count', 0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_resource_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates,
+                             migrations.RunPython.noop),
+    ]
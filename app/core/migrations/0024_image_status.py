@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    """Existing images were processed inside their upload request."""
+    for model_name in ('Product', 'Resource'):
+        model = apps.get_model('core', model_name)
+        (model.objects.exclude(image__isnull=True).exclude(image='')
+         .update(image_status='ready'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', editable=False, max_length=10),
+        ),
+        migrations.RunPython(mark_existing_images_ready,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.1.13 on 2026-10-17 02:44
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+SEARCH_DOCUMENT_TRIGGER = """
+CREATE FUNCTION core_product_search_document() RETURNS trigger AS $$
+BEGIN
+    NEW.search_document :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_product_search_document
+    BEFORE INSERT OR UPDATE OF name, description, search_document
+    ON core_product
+    FOR EACH ROW EXECUTE FUNCTION core_product_search_document();
+
+UPDATE core_product SET search_document = NULL;
+"""
+
+DROP_SEARCH_DOCUMENT_TRIGGER = """
+DROP TRIGGER core_product_search_document ON core_product;
+DROP FUNCTION core_product_search_document();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_image_variants'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_DOCUMENT_TRIGGER,
+                          DROP_SEARCH_DOCUMENT_TRIGGER),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='product_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
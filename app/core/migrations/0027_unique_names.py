@@ -0,0 +1,68 @@
+# Generated by Django 4.1.13 on 2026-10-17 02:48
+
+from django.db import migrations, models
+import django.db.models.functions.text
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and types whose names only differ by case.
+
+    The oldest object of each name is kept, and the product links of the
+    others are moved to it in bulk before they are deleted.
+    """
+    # Check foreign keys right away, as indexes can't be created with
+    # deferred checks pending in the same transaction.
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    Product = apps.get_model('core', 'Product')
+    for model_name, field_name in (('Tag', 'tags'), ('Product_type', 'types')):
+        Model = apps.get_model('core', model_name)
+        field = Product._meta.get_field(field_name)
+        through = field.remote_field.through
+        product_column = f'{field.m2m_field_name()}_id'
+        column = f'{field.m2m_reverse_field_name()}_id'
+
+        named = Model.objects.annotate(key=Lower('name'))
+        duplicated = (named.values('key')
+                      .annotate(count=models.Count('pk'))
+                      .filter(count__gt=1)
+                      .values('key'))
+        keepers, duplicates = {}, {}
+        for pk, key in (named.filter(key__in=duplicated)
+                        .order_by('pk').values_list('pk', 'key')):
+            keeper = keepers.setdefault(key, pk)
+            if keeper != pk:
+                duplicates[pk] = keeper
+        if not duplicates:
+            continue
+
+        links = through.objects.filter(**{f'{column}__in': duplicates})
+        through.objects.bulk_create(
+            [through(**{product_column: product_id,
+                        column: duplicates[pk]})
+             for product_id, pk in links.values_list(product_column, column)],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        links.delete()
+        Model.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_product_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product_type',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_product_type_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_tag_name'),
+        ),
+    ]
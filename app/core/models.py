@@ -5,7 +5,17 @@ import uuid
 import os
 
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models.functions import Cast, Lower, NullIf
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
@@ -18,6 +28,8 @@ from django.core.validators import (
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from core.versioning import bump_versions
+
 
 def image_file_path(instance, filename):
     """Generate file path for new product image."""
@@ -27,6 +39,36 @@ def image_file_path(instance, filename):
     return os.path.join('uploads', instance.__class__.__name__.lower(), filename)
 
 
+def content_file_path(instance, digest, ext, variant=None):
+    """Generate the content addressed path of a processed image."""
+    directory = os.path.join('uploads', instance.__class__.__name__.lower(),
+                             digest[:2])
+    if variant is None:
+        return os.path.join(directory, f'{digest}{ext}')
+
+    return os.path.join(directory, digest, f'{variant}{ext}')
+
+
+def release_image_files(instance, name=None, variants=None):
+    """Delete the stored image files of an object.
+
+    Processed images are content addressed and may be shared by several
+    objects, so files are only removed when no other object uses them.
+    Given the `name` and `variants` of an image the object used before,
+    releases those instead, unless any object, itself included, uses them.
+    """
+    objects = type(instance).objects
+    if name is None:
+        name, variants = instance.image.name, instance.image_variants
+        objects = objects.exclude(pk=instance.pk)
+    if not name or objects.filter(image=name).exists():
+        return
+
+    storage = instance._meta.get_field('image').storage
+    for stored in [name, *(variants or {}).values()]:
+        storage.delete(stored)
+
+
 class UserManager(BaseUserManager):
     """Manager for the users."""
 
@@ -53,6 +95,57 @@ class UserManager(BaseUserManager):
         return user
 
 
+class ImageStatus(models.TextChoices):
+    """Processing state of an uploaded image."""
+    NONE = 'none', 'No image'
+    PENDING = 'pending', 'Pending'
+    PROCESSING = 'processing', 'Processing'
+    READY = 'ready', 'Ready'
+    FAILED = 'failed', 'Failed'
+
+
+class NameManager(models.Manager):
+    """Manager for objects identified by their case-insensitive name."""
+
+    def filter_names(self, names):
+        """Return the objects named any of `names`, ignoring case.
+
+        The lookup probes the unique index on the lower-cased name.
+        """
+        return self.annotate(name_key=Lower('name')).filter(
+            name_key__in=[name.lower() for name in names],
+        )
+
+    def get_or_create_by_names(self, names):
+        """Return a name to object mapping, creating the missing names.
+
+        Uses one lookup for the existing names, one bulk insert for the
+        missing ones and one lookup for what was inserted, whatever the
+        number of names. Names differing only by case map to the same
+        object, created with the first spelling seen. Rows inserted
+        concurrently are skipped by the unique index and read back, so
+        racing writers never create duplicates nor fail.
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+
+        found = {obj.name.lower(): obj for obj in self.filter_names(names)}
+        missing = {}
+        for name in names:
+            if name.lower() not in found:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            self.bulk_create([self.model(name=name)
+                              for name in missing.values()],
+                             ignore_conflicts=True)
+            found.update((obj.name.lower(), obj)
+                         for obj in self.filter_names(missing.values()))
+            bump_versions(self.model)
+
+        return {name: found[name.lower()] for name in names}
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     """User in the system."""
     email = models.EmailField(max_length=255, unique=True)
@@ -70,8 +163,21 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class ProductManager(models.Manager):
+    """Manager for the products."""
+
+    def get_queryset(self):
+        """Return the products, without their search document.
+
+        Only the full text search reads it, within the database.
+        """
+        return super().get_queryset().defer('search_document')
+
+
 class Product(models.Model):
     """Product object."""
+    RATING_FIELDS = ('rating_avg', 'rating_count', 'rating_sum')
+
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     description = models.TextField(blank=True)
@@ -79,21 +185,87 @@ class Product(models.Model):
     tags = models.ManyToManyField('Tag', blank=True)
     resources = models.ManyToManyField('Resource', blank=True)
     image = models.ImageField(null=True, upload_to=image_file_path)
+    image_status = models.CharField(max_length=10,
+                                    choices=ImageStatus.choices,
+                                    default=ImageStatus.NONE,
+                                    editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    rating_avg = models.FloatField(null=True, blank=True, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    # Weighted name and description vector, kept up to date by a trigger.
+    search_document = SearchVectorField(null=True, editable=False)
+
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price'], name='product_price_idx'),
+            GinIndex(fields=['search_document'], name='product_search_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'],
+                     name='product_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     @property
     def rating(self):
-        """Calculate average of product rating."""
-        return self.rating_set.aggregate(models.Avg('value'))['value__avg']
+        """Return the stored average of product rating."""
+        return self.rating_avg
+
+    @staticmethod
+    def apply_rating_delta(product_id, count, total):
+        """Shift the rating aggregates of a product in a single UPDATE."""
+        Product.apply_rating_deltas({product_id: (count, total)})
+
+    @staticmethod
+    def apply_rating_deltas(deltas):
+        """Shift the rating aggregates of many products in a single UPDATE.
+
+        `deltas` maps product ids to (count, total) increments.
+        """
+        if not deltas:
+            return
+
+        def shift(field, index):
+            return models.F(field) + models.Case(
+                *[models.When(pk=pk, then=models.Value(delta[index]))
+                  for pk, delta in deltas.items()],
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            )
+
+        new_count = shift('rating_count', 0)
+        new_sum = shift('rating_sum', 1)
+        Product.objects.filter(pk__in=deltas).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Cast(new_sum, models.FloatField()) / NullIf(new_count, 0),
+        )
+        bump_versions(Product, pks=deltas)
+
+    def save(self, *args, **kwargs):
+        """Save product, never writing back its rating aggregates.
+
+        They are only shifted in the database by `apply_rating_deltas`, so
+        an update of an existing product leaves them out, along with the
+        deferred fields, unless `update_fields` says otherwise.
+        """
+        if (not self._state.adding and self.pk is not None
+                and kwargs.get('update_fields') is None):
+            skipped = {*self.RATING_FIELDS, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+
+        super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
         """Delete product and its image from database."""
 
-        if self.image:
-            if os.path.isfile(self.image.path):
-                os.remove(self.image.path)
+        release_image_files(self)
 
         super().delete(*args, **kwargs)
 
@@ -102,10 +274,103 @@ class Product_type(models.Model):
     """Product type object."""
     name = models.CharField(max_length=255)
 
+    objects = NameManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'),
+                                    name='unique_product_type_name'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class RatingQuerySet(models.QuerySet):
+    """Queryset of product ratings."""
+
+    def delete(self):
+        """Delete the ratings and take them out of the product aggregates.
+
+        The aggregates are shifted with a single UPDATE, whatever the
+        number of ratings.
+        """
+        with transaction.atomic(using=self.db):
+            deltas = rating_deltas(self)
+            deleted = super().delete()
+            Product.apply_rating_deltas(deltas)
+            bump_versions(self.model)
+
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+def rating_deltas(ratings):
+    """Return the product aggregate deltas that remove `ratings`."""
+    return {
+        product_id: (-count, -total)
+        for product_id, count, total in (
+            ratings.order_by().values('product_id')
+            .annotate(count=models.Count('pk'), total=models.Sum('value'))
+            .values_list('product_id', 'count', 'total')
+        )
+    }
+
+
+class RatingManager(models.Manager.from_queryset(RatingQuerySet)):
+    """Manager for product ratings."""
+
+    def upsert_for_user(self, user, values):
+        """Insert or update the ratings of a user in a single statement.
+
+        `values` maps product ids to rating values. The ratings are written
+        with one `INSERT ... ON CONFLICT (user, product) DO UPDATE` and the
+        product aggregates are shifted with one UPDATE. Concurrent upserts
+        of the same user are serialized on the user row, and the products
+        are locked in primary key order, so the deltas stay exact.
+
+        Return a product id to `created` flag mapping. Raise
+        `Product.DoesNotExist` when some of the products are unknown.
+        """
+        if not values:
+            return {}
+
+        product_ids = sorted(values)
+        with transaction.atomic(using=self.db):
+            list(type(user).objects.select_for_update()
+                 .filter(pk=user.pk).values_list('pk', flat=True))
+            found = set(Product.objects.select_for_update()
+                        .filter(pk__in=product_ids).order_by('pk')
+                        .values_list('pk', flat=True))
+            missing = [pk for pk in product_ids if pk not in found]
+            if missing:
+                raise Product.DoesNotExist(
+                    f'Unknown products: {", ".join(map(str, missing))}'
+                )
+
+            previous = dict(self.filter(user=user, product_id__in=product_ids)
+                            .values_list('product_id', 'value'))
+            self.bulk_create(
+                [self.model(user=user, product_id=pk, value=value)
+                 for pk, value in values.items()],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['value'],
+            )
+
+            deltas = {}
+            for pk, value in values.items():
+                delta = (int(pk not in previous), value - previous.get(pk, 0))
+                if delta != (0, 0):
+                    deltas[pk] = delta
+            Product.apply_rating_deltas(deltas)
+            bump_versions(self.model)
+
+        return {pk: pk not in previous for pk in values}
+
+
 class Rating(models.Model):
     """Products rating object."""
     user = models.ForeignKey(
@@ -118,6 +383,8 @@ class Rating(models.Model):
                                              validators=[MinValueValidator(1),
                                                          MaxValueValidator(5)])
 
+    objects = RatingManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=['user', 'product'],
@@ -128,11 +395,62 @@ class Rating(models.Model):
         """Return rating string representation."""
         return f'{self.product.name}>{self.user.name}>{self.value}'
 
+    def save(self, *args, **kwargs):
+        """Save rating and keep the product rating aggregates in sync."""
+        with transaction.atomic(using=kwargs.get('using')):
+            previous = None
+            if self.pk is not None:
+                previous = (Rating.objects.select_for_update()
+                            .filter(pk=self.pk)
+                            .values('product_id', 'value')
+                            .first())
+
+            super().save(*args, **kwargs)
+
+            if previous is None:
+                Product.apply_rating_delta(self.product_id, 1, self.value)
+            elif previous['product_id'] != self.product_id:
+                Product.apply_rating_delta(previous['product_id'],
+                                           -1, -previous['value'])
+                Product.apply_rating_delta(self.product_id, 1, self.value)
+            elif previous['value'] != self.value:
+                Product.apply_rating_delta(self.product_id,
+                                           0, self.value - previous['value'])
+
+    def delete(self, *args, **kwargs):
+        """Delete rating and take it out of its product aggregates."""
+        with transaction.atomic(using=kwargs.get('using')):
+            deleted = super().delete(*args, **kwargs)
+            Product.apply_rating_delta(self.product_id, -1, -self.value)
+            bump_versions(Rating)
+
+        return deleted
+
+
+# Ratings have no delete signal receivers, so that they are fast deleted
+# when their product or their user goes. The ratings of a deleted user
+# are taken out of the aggregates of their products beforehand, with a
+# single UPDATE.
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remove_user_ratings_from_products(sender, instance, **kwargs):
+    """Take the ratings of a deleted user out of the product aggregates."""
+    deltas = rating_deltas(Rating.objects.filter(user=instance))
+    if deltas:
+        Product.apply_rating_deltas(deltas)
+        bump_versions(Rating)
+
 
 class Tag(models.Model):
     """Tag object in db."""
     name = models.CharField(max_length=45, blank=False, null=False)
 
+    objects = NameManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='unique_tag_name'),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
@@ -143,15 +461,51 @@ class Resource(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2,
                                 blank=True, null=True)
     image = models.ImageField(null=True, upload_to=image_file_path)
+    image_status = models.CharField(max_length=10,
+                                    choices=ImageStatus.choices,
+                                    default=ImageStatus.NONE,
+                                    editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def delete(self, *args, **kwargs):
         """Delete resource and its image from database."""
 
-        if self.image:
-            if os.path.isfile(self.image.path):
-                os.remove(self.image.path)
+        release_image_files(self)
 
         super().delete(*args, **kwargs)
 
     def __str__(self) -> str:
         return self.name
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Product_type)
+@receiver(post_delete, sender=Product_type)
+@receiver(post_save, sender=Rating)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def bump_catalog_version(sender, instance, **kwargs):
+    """Invalidate cached catalog data of a written object."""
+    bump_versions(sender, pks=[instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def bump_cascaded_rating_version(sender, **kwargs):
+    """Invalidate cached ratings, fast deleted along with their product."""
+    bump_versions(Rating)
+
+
+@receiver(m2m_changed, sender=Product.types.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.resources.through)
+def bump_product_version(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """Invalidate cached products when their relations change."""
+    if action.startswith('post_'):
+        if not reverse:
+            pk_set = [instance.pk]
+        # Clearing from the related side doesn't name the products.
+        bump_versions(Product, pks=pk_set)
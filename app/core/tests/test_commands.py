@@ -1,13 +1,24 @@
 """
 Tests custom Django management commands.
 """
+from decimal import Decimal
+from io import StringIO
+import tempfile
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.management.commands.bench_api import Command as BenchApiCommand
+from core.management.commands.bench_api import percentile, route_names
+from core.management.commands.bench_serialization import (
+    Command as BenchSerializationCommand,
+)
+from core.models import Product, Rating
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +43,87 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class RebuildRatingAggregatesTests(TestCase):
+    """Test the rebuild_rating_aggregates command."""
+
+    def test_rebuild_rating_aggregates(self):
+        """Test aggregates are recomputed from the ratings table."""
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'testpass123')
+        product = Product.objects.create(name='Product', price=Decimal('10'))
+        unrated = Product.objects.create(name='Unrated', price=Decimal('10'))
+        Rating.objects.create(user=user, product=product, value=4)
+        Product.objects.update(rating_count=9, rating_sum=9, rating_avg=1)
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+
+        product.refresh_from_db()
+        unrated.refresh_from_db()
+        self.assertEqual(product.rating_count, 1)
+        self.assertEqual(product.rating_sum, 4)
+        self.assertEqual(product.rating, 4)
+        self.assertEqual(unrated.rating_count, 0)
+        self.assertIsNone(unrated.rating)
+
+
+class PercentileTests(SimpleTestCase):
+    """Test the latency percentiles of the bench_api command."""
+
+    def test_nearest_rank(self):
+        """Test percentiles pick the nearest rank of sorted durations."""
+        durations = [index / 1000 for index in range(1, 11)]
+
+        self.assertEqual(percentile(durations, 50), 5)
+        self.assertEqual(percentile(durations, 95), 10)
+        self.assertEqual(percentile(durations, 90), 9)
+        self.assertEqual(percentile(durations, 0), 1)
+        self.assertEqual(percentile([0.004], 99), 4)
+
+
+class BenchApiTests(TestCase):
+    """Test the bench_api command."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(CATALOG_CACHE_TIMEOUT=0,
+                                     IMAGE_PROCESSING_EXECUTOR='inline',
+                                     MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.command = BenchApiCommand(stdout=StringIO(), stderr=StringIO())
+
+    def test_every_endpoint_succeeds(self):
+        """Test every route is benchmarked and answers successfully."""
+        fixture = self.command._build_fixture(50)
+
+        results = self.command._run(fixture, {'endpoint': [],
+                                              'iterations': 1})
+
+        self.assertEqual(self.command.stderr.getvalue(), '')
+        self.assertTrue(set(route_names())
+                        <= {case[1] for case
+                            in self.command._endpoints(fixture)})
+        for result in results:
+            with self.subTest(endpoint=result['name']):
+                self.assertLess(max(result['status']), 400)
+                self.assertGreater(result['peak_kib'], 0)
+
+
+class BenchSerializationTests(TestCase):
+    """Test the bench_serialization command."""
+
+    def test_compares_serializers_and_rows(self):
+        """Test both renderings are measured for lists and details."""
+        BenchApiCommand._create_catalog(20)
+        command = BenchSerializationCommand(stdout=StringIO())
+
+        for action in ('list', 'retrieve'):
+            with self.subTest(action=action):
+                result = command._compare(action, 20, 1)
+
+                self.assertEqual(result['action'], action)
+                self.assertGreater(result['serializers_ms'], 0)
+                self.assertGreater(result['rows_ms'], 0)
@@ -0,0 +1,234 @@
+"""
+Tests for the compression of the responses.
+"""
+from decimal import Decimal
+import gzip
+import json
+from unittest.mock import patch
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import compression
+from core.compression import (
+    compress_stream,
+    is_compressible,
+    negotiate_encoding,
+)
+from core.models import Product
+
+
+PRODUCTS_URL = reverse('product:product-list')
+EXPORT_URL = reverse('product:product-export')
+
+
+def create_products(count):
+    """Create `count` products, enough for a compressible list."""
+    return Product.objects.bulk_create(
+        Product(name=f'Product {i}', price=Decimal('10'),
+                description='Description') for i in range(count)
+    )
+
+
+class NegotiationTests(SimpleTestCase):
+    """Test the choice of the coding and of the responses to compress."""
+
+    def test_prefers_brotli(self):
+        """Test brotli wins over gzip when available and as accepted."""
+        with patch.object(compression, 'brotli', object()):
+            self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+            self.assertEqual(negotiate_encoding('br;q=0.5, gzip'), 'gzip')
+            self.assertEqual(negotiate_encoding('*'), 'br')
+
+    def test_gzip_without_brotli(self):
+        """Test gzip is used when brotli isn't installed."""
+        with patch.object(compression, 'brotli', None):
+            self.assertEqual(negotiate_encoding('br, gzip;q=0.1'), 'gzip')
+            self.assertIsNone(negotiate_encoding('br'))
+
+    def test_refused_codings(self):
+        """Test codings refused or not listed aren't used."""
+        self.assertIsNone(negotiate_encoding(''))
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding('gzip;q=0, br;q=0'))
+        self.assertIsNone(negotiate_encoding('*;q=0'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=100)
+    def test_compressible_responses(self):
+        """Test small responses and compressed media are left alone."""
+        body = b'x' * 100
+
+        self.assertTrue(is_compressible(HttpResponse(body)))
+        self.assertFalse(is_compressible(HttpResponse(body[:99])))
+        self.assertFalse(is_compressible(
+            HttpResponse(body, content_type='image/webp')
+        ))
+        self.assertTrue(is_compressible(
+            HttpResponse(body, content_type='image/svg+xml')
+        ))
+        no_transform = HttpResponse(body)
+        no_transform['Cache-Control'] = 'no-transform'
+        self.assertFalse(is_compressible(no_transform))
+
+
+class CompressStreamTests(SimpleTestCase):
+    """Test the compression of streamed content."""
+
+    def assertCompactStream(self, encoding, decompress):
+        """Assert small chunks compress about as well as the whole body."""
+        chunks = [f'{{"id": {i}, "name": "Product {i}"}}\n'.encode()
+                  for i in range(1000)]
+        body = b''.join(chunks)
+
+        streamed = b''.join(compress_stream(chunks, encoding))
+
+        self.assertEqual(decompress(streamed), body)
+        self.assertLessEqual(len(streamed),
+                             len(compression.compress(body, encoding)) * 1.1)
+
+    def test_gzip_stream(self):
+        """Test a gzip stream isn't flushed chunk by chunk."""
+        self.assertCompactStream('gzip', gzip.decompress)
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli_stream(self):
+        """Test a brotli stream isn't flushed chunk by chunk."""
+        self.assertCompactStream('br', compression.brotli.decompress)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTests(TestCase):
+    """Test the API responses are compressed."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        create_products(20)
+
+    def test_gzip_list(self):
+        """Test a list is gzipped, with the headers of its coding."""
+        plain = self.client.get(PRODUCTS_URL)
+
+        res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        self.assertLess(len(res.content), len(plain.content))
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertEqual(res['ETag'], plain['ETag'][:-1] + '-gzip"')
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli_list(self):
+        """Test a list is compressed with brotli when accepted."""
+        plain = self.client.get(PRODUCTS_URL)
+
+        res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(res.content),
+                         plain.content)
+
+    def test_coded_etag_validates(self):
+        """Test the ETag of a compressed list answers If-None-Match."""
+        etag = self.client.get(PRODUCTS_URL,
+                               HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT_ENCODING='gzip',
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_coded_etag_guards_writes(self):
+        """Test If-Match holds with the ETag of a compressed read."""
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_superuser(
+            email='superuser@example.com', password='pass123',
+        ))
+        product = Product.objects.create(name='Product', price=Decimal('1'),
+                                         description='x' * 500)
+        url = reverse('product:product-detail', args=[product.id])
+        etag = client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+
+        res = client.patch(url, {'name': 'New'}, format='json',
+                           HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = client.patch(url, {'name': 'Newer'}, format='json',
+                           HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_not_accepted(self):
+        """Test responses stay plain without an Accept-Encoding."""
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertNotIn('Content-Encoding', res)
+        self.assertIn('Accept-Encoding', res['Vary'])
+        json.loads(res.content)
+
+    def test_cached_response_compressed_once(self):
+        """Test the compressed body of a cached response is reused."""
+        with patch('core.compression.compress',
+                   wraps=compression.compress) as compress:
+            first = self.client.get(PRODUCTS_URL,
+                                    HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(PRODUCTS_URL,
+                                     HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(second.content, first.content)
+
+    def test_unshared_response_compressed_every_time(self):
+        """Test bodies that aren't marked shared are never cached."""
+        def get_response(request):
+            response = HttpResponse(b'<p>user@example.com</p>' * 20,
+                                    content_type='text/html')
+            response['ETag'] = '"same"'
+            return response
+
+        middleware = compression.CompressionMiddleware(get_response)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        with patch('core.compression.compress',
+                   wraps=compression.compress) as compress:
+            middleware(request)
+            middleware(request)
+
+        self.assertEqual(compress.call_count, 2)
+
+    def test_compressed_cache_follows_writes(self):
+        """Test a write leads to compressing the new content."""
+        self.client.get(PRODUCTS_URL, HTTP_ACCEPT_ENCODING='gzip')
+        Product.objects.create(name='New product', price=Decimal('1'))
+
+        res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        names = [item['name'] for item
+                 in json.loads(gzip.decompress(res.content))['results']]
+        self.assertIn('New product', names)
+
+    def test_streaming_export(self):
+        """Test streamed responses are compressed as they stream."""
+        plain = b''.join(self.client.get(EXPORT_URL).streaming_content)
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', res)
+        self.assertEqual(gzip.decompress(b''.join(res.streaming_content)),
+                         plain)
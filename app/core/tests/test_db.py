@@ -0,0 +1,183 @@
+"""
+Tests for the database backend and its connection pool.
+"""
+import threading
+from unittest.mock import Mock
+
+from prometheus_client import REGISTRY
+
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+
+from core.db.base import DatabaseWrapper
+from core.db.pool import (
+    ConnectionPool,
+    PoolTimeout,
+    close_pools,
+    stats,
+)
+
+
+def sample(name, **labels):
+    """Return the current value of a sample, 0 if never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def create_pool(size=1, timeout=0.05):
+    """Create and return a pool closing mock connections."""
+    return ConnectionPool(size, timeout, close=lambda conn: conn.close())
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the bounded connection pool."""
+
+    def test_released_connection_reused(self):
+        """Test a released connection is handed out again."""
+        pool = create_pool()
+        connect = Mock(side_effect=lambda: Mock())
+
+        first = pool.acquire(connect)
+        pool.release(first)
+        second = pool.acquire(connect)
+
+        self.assertIs(first, second)
+        connect.assert_called_once()
+        self.assertEqual(pool.usage(), {'in_use': 1, 'idle': 0})
+
+    def test_acquire_times_out_when_exhausted(self):
+        """Test acquiring from an exhausted pool times out."""
+        pool = create_pool()
+        pool.acquire(Mock)
+        before = stats.snapshot()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(Mock)
+
+        after = stats.snapshot()
+        self.assertEqual(after['timeouts'], before['timeouts'] + 1)
+        self.assertGreater(after['wait_seconds'], before['wait_seconds'])
+
+    def test_waiter_gets_released_connection(self):
+        """Test a waiting thread gets the connection released meanwhile."""
+        pool = create_pool(timeout=5)
+        held = pool.acquire(Mock)
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(pool.acquire(Mock))
+        )
+
+        waiter.start()
+        pool.release(held)
+        waiter.join(5)
+
+        self.assertEqual(acquired, [held])
+
+    def test_failed_check_replaces_connection(self):
+        """Test an idle connection failing its check is replaced."""
+        pool = create_pool()
+        stale = pool.acquire(Mock)
+        pool.release(stale)
+
+        fresh = pool.acquire(Mock, check=lambda conn: False)
+
+        self.assertIsNot(fresh, stale)
+        stale.close.assert_called_once()
+
+    def test_discard_frees_slot(self):
+        """Test discarded connections are closed and free their slot."""
+        pool = create_pool()
+        broken = pool.acquire(Mock)
+
+        pool.release(broken, discard=True)
+
+        broken.close.assert_called_once()
+        self.assertEqual(pool.usage(), {'in_use': 0, 'idle': 0})
+
+    def test_connect_failure_frees_slot(self):
+        """Test a failed connect doesn't leak its slot."""
+        pool = create_pool()
+
+        with self.assertRaises(ValueError):
+            pool.acquire(Mock(side_effect=ValueError))
+
+        self.assertIsNotNone(pool.acquire(Mock))
+
+
+class PooledBackendTests(SimpleTestCase):
+    """Test the database backend with and without a pool."""
+    databases = {'default'}
+
+    def setUp(self):
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        close_pools()
+
+    def create_wrapper(self, **pool):
+        """Create and return a database wrapper for the test database."""
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'POOL': pool},
+                                  alias=connection.alias)
+        self.wrappers.append(wrapper)
+
+        return wrapper
+
+    def test_closed_connection_returns_to_pool(self):
+        """Test closing a pooled connection lets another wrapper reuse it."""
+        first = self.create_wrapper(SIZE=1, TIMEOUT=0.05)
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        before = stats.snapshot()
+        in_use = sample('db_pool_connections', state='in_use')
+        idle = sample('db_pool_connections', state='idle')
+
+        second = self.create_wrapper(SIZE=1, TIMEOUT=0.05)
+        with second.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIs(second.connection, raw)
+        after = stats.snapshot()
+        self.assertEqual(after['opened'], before['opened'])
+        self.assertEqual(after['reused'], before['reused'] + 1)
+        self.assertEqual(sample('db_pool_connections', state='in_use'),
+                         in_use + 1)
+        self.assertEqual(sample('db_pool_connections', state='idle'),
+                         idle - 1)
+
+    def test_exhausted_pool_raises_operational_error(self):
+        """Test waiting too long for a connection is a database error."""
+        self.create_wrapper(SIZE=1, TIMEOUT=0.05).ensure_connection()
+
+        with self.assertRaises(OperationalError):
+            self.create_wrapper(SIZE=1, TIMEOUT=0.05).ensure_connection()
+
+    def test_open_transaction_rolled_back_on_release(self):
+        """Test a connection is returned to the pool outside a transaction."""
+        first = self.create_wrapper(SIZE=1, TIMEOUT=0.05)
+        first.ensure_connection()
+        first.connection.autocommit = False
+        with first.connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        first.close()
+
+        second = self.create_wrapper(SIZE=1, TIMEOUT=0.05)
+        second.ensure_connection()
+
+        self.assertTrue(second.get_autocommit())
+
+    def test_connections_counted_without_pool(self):
+        """Test connections opened and closed are counted without a pool."""
+        wrapper = self.create_wrapper()
+        before = stats.snapshot()
+        exported = sample('db_connections_total', event='opened')
+
+        wrapper.ensure_connection()
+        wrapper.close()
+
+        after = stats.snapshot()
+        self.assertEqual(after['opened'], before['opened'] + 1)
+        self.assertEqual(after['closed'], before['closed'] + 1)
+        self.assertEqual(sample('db_connections_total', event='opened'),
+                         exported + 1)
@@ -0,0 +1,170 @@
+"""
+Tests for the Prometheus metrics.
+"""
+from decimal import Decimal
+from io import BytesIO
+import os
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Product
+
+
+METRICS_URL = reverse('metrics')
+PRODUCTS_URL = reverse('product:product-list')
+TOKEN_URL = reverse('user:token')
+
+
+def sample(name, **labels):
+    """Return the current value of a sample, 0 if never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsApiTests(TestCase):
+    """Test the metrics recorded while serving the API."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Product',
+                                              price=Decimal('10'))
+
+    def test_requests_exposed_by_route(self):
+        """Test requests are counted and timed by route name."""
+        labels = {'route': 'product:product-list', 'method': 'GET'}
+        before = sample('http_requests_total', status='200', **labels)
+        queries = sample('http_request_db_queries_count', **labels)
+
+        self.client.get(PRODUCTS_URL)
+        with self.settings(METRICS_TOKEN='secret'):
+            res = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds_bucket{', res.content)
+        self.assertIn(b'db_connections_total{', res.content)
+        self.assertEqual(sample('http_requests_total', status='200',
+                                **labels), before + 1)
+        self.assertEqual(sample('http_request_db_queries_count', **labels),
+                         queries + 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """Test scrapes must send the metrics token when one is set."""
+        denied = self.client.get(METRICS_URL)
+        allowed = self.client.get(METRICS_URL,
+                                  HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+
+    def test_metrics_denied_without_token(self):
+        """Test the metrics are denied by default, open only in DEBUG."""
+        denied = self.client.get(METRICS_URL)
+        with self.settings(DEBUG=True):
+            allowed = self.client.get(METRICS_URL)
+
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+
+    def test_catalog_cache_lookups(self):
+        """Test catalog cache misses and hits are counted."""
+        misses = sample('cache_requests_total', cache='catalog-response',
+                        result='miss')
+        hits = sample('cache_requests_total', cache='catalog-response',
+                      result='hit')
+
+        self.client.get(PRODUCTS_URL)
+        self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(sample('cache_requests_total',
+                                cache='catalog-response', result='miss'),
+                         misses + 1)
+        self.assertEqual(sample('cache_requests_total',
+                                cache='catalog-response', result='hit'),
+                         hits + 1)
+
+    def test_auth_failures(self):
+        """Test bad tokens and bad credentials are counted."""
+        get_user_model().objects.create_user('user@example.com', 'pass123')
+        tokens = sample('auth_failures_total', reason='token')
+        credentials = sample('auth_failures_total', reason='credentials')
+
+        self.client.get(PRODUCTS_URL, HTTP_AUTHORIZATION='Token bad')
+        self.client.post(TOKEN_URL, {'email': 'user@example.com',
+                                     'password': 'wrong'})
+
+        self.assertEqual(sample('auth_failures_total', reason='token'),
+                         tokens + 1)
+        self.assertEqual(sample('auth_failures_total', reason='credentials'),
+                         credentials + 1)
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline')
+    def test_image_uploads(self):
+        """Test image upload sizes and processing durations are recorded."""
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('staff@example.com',
+                                                      'pass123')
+        )
+        data = BytesIO()
+        Image.new('RGB', (10, 10)).save(data, format='JPEG')
+        uploads = sample('image_upload_bytes_count', model='core.Product')
+        processed = sample('image_processing_duration_seconds_count',
+                           model='core.Product', outcome='ready')
+
+        with self.settings(MEDIA_ROOT=media_root.name), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('product:product-upload-image',
+                        args=[self.product.id]),
+                {'image': SimpleUploadedFile('image.jpg', data.getvalue())},
+                format='multipart',
+            )
+
+        self.assertEqual(sample('image_upload_bytes_count',
+                                model='core.Product'), uploads + 1)
+        self.assertGreater(sample('image_upload_bytes_sum',
+                                  model='core.Product'), 0)
+        self.assertEqual(sample('image_processing_duration_seconds_count',
+                                model='core.Product', outcome='ready'),
+                         processed + 1)
+
+
+class MultiProcessMetricsTests(SimpleTestCase):
+    """Test samples of several processes are aggregated."""
+
+    def test_processes_aggregated(self):
+        """Test the counters of every worker process are summed."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory.name}
+        script = ('from core.metrics import auth_failures_total; '
+                  'auth_failures_total.labels("token").inc()')
+
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', script], env=env,
+                           cwd=settings.BASE_DIR, check=True)
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=directory.name)
+        self.assertEqual(
+            registry.get_sample_value('auth_failures_total',
+                                      {'reason': 'token'}),
+            2,
+        )
@@ -0,0 +1,65 @@
+"""
+Tests for data migrations.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateNamesTests(TransactionTestCase):
+    """Test tags and types differing by case are merged on migration."""
+    before = [('core', '0026_product_search')]
+    after = [('core', '0027_unique_names')]
+
+    def migrate(self, targets):
+        """Migrate the database and return the historical apps."""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_merged_into_oldest(self):
+        """Test the product links of duplicates move to the oldest object."""
+        apps = self.migrate(self.before)
+        Product = apps.get_model('core', 'Product')
+        Tag = apps.get_model('core', 'Tag')
+        Product_type = apps.get_model('core', 'Product_type')
+        playa, playa_upper, playa_lower, fimo = (
+            Tag.objects.create(name=name)
+            for name in ('Playa', 'PLAYA', 'playa', 'Fimo')
+        )
+        ring = Product_type.objects.create(name='Ring')
+        Product_type.objects.create(name='ring')
+        product1 = Product.objects.create(name='One', price=Decimal('1'))
+        product1.tags.add(playa, playa_upper, fimo)
+        product2 = Product.objects.create(name='Two', price=Decimal('1'))
+        product2.tags.add(playa_lower)
+        product2.types.add(Product_type.objects.get(name='ring'))
+
+        apps = self.migrate(self.after)
+        Product = apps.get_model('core', 'Product')
+        Tag = apps.get_model('core', 'Tag')
+        Product_type = apps.get_model('core', 'Product_type')
+
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)),
+                         ['Fimo', 'Playa'])
+        self.assertEqual(list(Product_type.objects.values_list('pk',
+                                                               flat=True)),
+                         [ring.pk])
+        self.assertEqual(
+            sorted(Product.objects.get(pk=product1.pk)
+                   .tags.values_list('pk', flat=True)),
+            [playa.pk, fimo.pk],
+        )
+        product2 = Product.objects.get(pk=product2.pk)
+        self.assertEqual(list(product2.tags.values_list('pk', flat=True)),
+                         [playa.pk])
+        self.assertEqual(list(product2.types.values_list('pk', flat=True)),
+                         [ring.pk])
@@ -2,7 +2,9 @@
 Tests for models.
 """
 from unittest.mock import patch
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 from decimal import Decimal
@@ -109,3 +111,130 @@ class ModelTests(TestCase):
 
         self.assertEqual(product_file_path, f'uploads/product/{uuid}.jpg')
         self.assertEqual(resource_file_path, f'uploads/resource/{uuid}.jpg')
+
+    def test_rating_aggregates_follow_ratings(self):
+        """Test product rating aggregates on rating create/update/delete."""
+        user1 = create_user(email='user1@example.com')
+        user2 = create_user(email='user2@example.com')
+        product = models.Product.objects.create(name='Test Product',
+                                                price=Decimal('350'))
+
+        rating1 = models.Rating.objects.create(user=user1, product=product,
+                                               value=2)
+        models.Rating.objects.create(user=user2, product=product, value=5)
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 2)
+        self.assertEqual(product.rating_sum, 7)
+        self.assertEqual(product.rating, 3.5)
+
+        rating1.value = 4
+        rating1.save()
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 2)
+        self.assertEqual(product.rating, 4.5)
+
+        models.Rating.objects.filter(user=user2).delete()
+        rating1.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 0)
+        self.assertEqual(product.rating_sum, 0)
+        self.assertIsNone(product.rating)
+
+    def test_product_save_keeps_rating_aggregates(self):
+        """Test saving a stale product instance keeps its rating aggregates."""
+        product = models.Product.objects.create(name='Test Product',
+                                                price=Decimal('350'))
+        models.Rating.objects.create(user=create_user(), product=product,
+                                     value=3)
+
+        product.name = 'New Name'
+        product.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.name, 'New Name')
+        self.assertEqual(product.rating_count, 1)
+        self.assertEqual(product.rating, 3)
+
+    def test_user_delete_removes_ratings_from_aggregates(self):
+        """Test deleting a user takes their ratings out of the aggregates."""
+        user = create_user(email='user1@example.com')
+        products = [
+            models.Product.objects.create(name=f'Product {i}',
+                                          price=Decimal('10'))
+            for i in range(3)
+        ]
+        for product in products:
+            models.Rating.objects.create(user=user, product=product, value=4)
+        models.Rating.objects.create(user=create_user(), product=products[0],
+                                     value=2)
+
+        user.delete()
+
+        counts = dict(models.Product.objects.values_list('id',
+                                                         'rating_count'))
+        self.assertEqual(counts, {products[0].id: 1, products[1].id: 0,
+                                  products[2].id: 0})
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].rating, 2)
+
+    def test_product_delete_queries_ignore_ratings(self):
+        """Test the ratings of a deleted product are fast deleted."""
+        def delete_queries(ratings):
+            product = models.Product.objects.create(name='Test Product',
+                                                    price=Decimal('10'))
+            for i in range(ratings):
+                models.Rating.objects.create(
+                    user=create_user(email=f'user{ratings}-{i}@example.com'),
+                    product=product, value=3,
+                )
+            with CaptureQueriesContext(connection) as queries:
+                product.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries(5), delete_queries(1))
+        self.assertFalse(models.Rating.objects.exists())
+
+    def test_product_search_document_deferred(self):
+        """Test products are loaded without their search document."""
+        product = models.Product.objects.create(name='Test Product',
+                                                price=Decimal('10'))
+
+        with CaptureQueriesContext(connection) as queries:
+            loaded = models.Product.objects.get(pk=product.pk)
+
+        self.assertNotIn('"search_document"', queries[0]['sql'])
+        self.assertIn('search_document', loaded.get_deferred_fields())
+
+    def test_tag_names_unique_ignoring_case(self):
+        """Test two tags can't share a name differing only by case."""
+        models.Tag.objects.create(name='Playa')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(name='PLAYA')
+
+    def test_get_or_create_by_names_ignores_case(self):
+        """Test names differing by case resolve to one object."""
+        tag = models.Tag.objects.create(name='Playa')
+
+        found = models.Tag.objects.get_or_create_by_names(
+            ['playa', 'Fimo', 'FIMO', 'Playa']
+        )
+
+        self.assertEqual(found['playa'], tag)
+        self.assertEqual(found['Playa'], tag)
+        self.assertEqual(found['Fimo'], found['FIMO'])
+        self.assertEqual(found['FIMO'].name, 'Fimo')
+        self.assertEqual(models.Tag.objects.count(), 2)
+
+    def test_get_or_create_by_names_skips_concurrent_inserts(self):
+        """Test a name inserted since the lookup is read back, not duplicated."""
+        manager = models.Tag.objects
+        lookup = manager.filter_names
+        concurrent = models.Tag.objects.create(name='Playa')
+
+        with patch.object(manager, 'filter_names',
+                          side_effect=[manager.none(), lookup(['Playa'])]):
+            found = manager.get_or_create_by_names(['playa'])
+
+        self.assertEqual(found['playa'], concurrent)
+        self.assertEqual(models.Tag.objects.count(), 1)
@@ -0,0 +1,147 @@
+"""
+Tests for the routing of reads to the read replicas.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.routing import STICKY_KEY, ReplicaRouter, set_read_alias
+from core.models import Product
+
+
+# Test mirror of the primary. Its own connection doesn't see what the
+# test case wrote in its transaction, as a lagging replica wouldn't.
+REPLICA = 'replica'
+
+PRODUCTS_URL = reverse('product:product-list')
+RATING_URL = reverse('product:rating-list')
+
+
+def result_list(res):
+    """Return the results of a response, paginated or not."""
+    return res.data['results'] if 'results' in res.data else res.data
+
+
+@contextmanager
+def record_reads():
+    """Record the alias every read is routed to, None for the primary."""
+    aliases = []
+    db_for_read = ReplicaRouter.db_for_read
+
+    def recording(router, model, **hints):
+        alias = db_for_read(router, model, **hints)
+        aliases.append(alias)
+        return alias
+
+    with patch.object(ReplicaRouter, 'db_for_read', recording):
+        yield aliases
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """Test the decisions of the database router."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.addCleanup(set_read_alias, None)
+
+    def test_reads_follow_request_alias(self):
+        """Test reads go to the replica chosen for the request, if any."""
+        self.assertIsNone(self.router.db_for_read(Product))
+
+        set_read_alias(REPLICA)
+
+        self.assertEqual(self.router.db_for_read(Product), REPLICA)
+
+    def test_writes_go_to_primary(self):
+        """Test an instance read from a replica is written to the primary."""
+        product = Product(name='Product', price=Decimal('10'))
+        product._state.db = REPLICA
+
+        self.assertEqual(self.router.db_for_write(Product, instance=product),
+                         DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_replicas_not_migrated(self):
+        """Test migrations only run against the primary."""
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'core'))
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DB_REPLICA_STICKY_SECONDS=5)
+class ReplicaReadTests(TestCase):
+    """Test the API reads from the replicas when it safely can."""
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.product = Product.objects.create(name='Product',
+                                              price=Decimal('10'))
+
+    def test_safe_request_reads_replica(self):
+        """Test a safe request reads from a replica."""
+        with record_reads() as aliases:
+            res = self.client.get(RATING_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(REPLICA, aliases)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replica_reads_primary(self):
+        """Test reads stay on the primary without replicas."""
+        with record_reads() as aliases:
+            self.client.get(RATING_URL)
+
+        self.assertEqual(set(aliases), {None})
+
+    def test_writer_sticks_to_primary(self):
+        """Test a user who just wrote reads their write from the primary."""
+        self.client.force_authenticate(self.user)
+        other_client = APIClient()
+        other_client.force_authenticate(
+            get_user_model().objects.create_user(email='other@example.com',
+                                                 password='testpass123')
+        )
+
+        with record_reads() as aliases:
+            res = self.client.post(RATING_URL,
+                                   {'product': self.product.id, 'value': 4})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(set(aliases), {None})
+        self.assertTrue(cache.get(STICKY_KEY.format(self.user.pk)))
+
+        res = self.client.get(RATING_URL)
+        self.assertEqual(len(result_list(res)), 1)
+
+        res = other_client.get(RATING_URL)
+        self.assertEqual(result_list(res), [])
+
+    def test_recent_catalog_write_reads_primary(self):
+        """Test the catalog is read from the primary right after a write."""
+        with record_reads() as aliases:
+            res = self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(set(aliases), {None})
+        self.assertEqual(len(result_list(res)), 1)
+
+    @override_settings(DB_REPLICA_STICKY_SECONDS=0)
+    def test_settled_catalog_reads_replica(self):
+        """Test the catalog is read from a replica once writes settled."""
+        with record_reads() as aliases:
+            res = self.client.get(PRODUCTS_URL)
+
+        self.assertIn(REPLICA, aliases)
+        self.assertEqual(result_list(res), [])
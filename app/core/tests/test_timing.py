@@ -0,0 +1,126 @@
+"""
+Tests for the per-request timings.
+"""
+from decimal import Decimal
+import re
+
+from prometheus_client import REGISTRY
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Product
+from core.timing import RequestTimings, _timings, timed
+
+
+PRODUCTS_URL = reverse('product:product-list')
+
+
+def sample(name, **labels):
+    """Return the current value of a sample, 0 if never recorded."""
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def parse_server_timing(header):
+    """Return the {name: (duration, description)} of a Server-Timing."""
+    metrics = {}
+    for metric in header.split(', '):
+        name, *params = metric.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(params['dur']), params.get('desc'))
+
+    return metrics
+
+
+class TimedTests(TestCase):
+    """Test timing the phases of a request."""
+
+    def setUp(self):
+        self.timings = RequestTimings()
+        token = _timings.set(self.timings)
+        self.addCleanup(_timings.reset, token)
+
+    def test_queries_recorded(self):
+        """Test queries are counted and timed."""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_sleep(0.01)')
+
+        self.assertEqual(self.timings.queries, 1)
+        self.assertGreaterEqual(self.timings.db, 0.01)
+
+    def test_phase_excludes_queries(self):
+        """Test the time of the queries of a phase is not counted in it."""
+        with timed('serialize'):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_sleep(0.05)')
+
+        self.assertLess(self.timings.phases['serialize'], 0.05)
+        self.assertGreaterEqual(self.timings.db, 0.05)
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class ServerTimingTests(TestCase):
+    """Test the Server-Timing header and the per-view aggregates."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Product.objects.create(name='Product', price=Decimal('10'))
+
+    def test_staff_gets_server_timing(self):
+        """Test staff callers get the timings of their request."""
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('staff@example.com',
+                                                      'pass123')
+        )
+
+        res = self.client.get(PRODUCTS_URL)
+
+        metrics = parse_server_timing(res['Server-Timing'])
+        self.assertEqual(set(metrics),
+                         {'db', 'serialize', 'render', 'compress', 'total'})
+        queries = int(re.match(r'"(\d+) queries"', metrics['db'][1])[1])
+        self.assertGreater(queries, 0)
+        self.assertGreater(metrics['serialize'][0], 0)
+        self.assertGreater(metrics['render'][0], 0)
+        self.assertGreaterEqual(metrics['total'][0], metrics['db'][0])
+
+    def test_anonymous_gets_no_server_timing(self):
+        """Test timings are hidden from non-staff callers."""
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(DEBUG=True)
+    def test_debug_exposes_server_timing(self):
+        """Test timings are shown to every caller in debug."""
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertIn('Server-Timing', res)
+
+    def test_phases_exported(self):
+        """Test the phases of every request are added to the metrics."""
+        labels = {'route': 'product:product-list', 'method': 'GET'}
+        before = {phase: sample('http_request_phase_duration_seconds_count',
+                                phase=phase, **labels)
+                  for phase in RequestTimings.PHASES}
+
+        self.client.get(PRODUCTS_URL)
+        self.client.get(PRODUCTS_URL)
+
+        for phase in RequestTimings.PHASES:
+            self.assertEqual(
+                sample('http_request_phase_duration_seconds_count',
+                       phase=phase, **labels),
+                before[phase] + 2,
+            )
+        self.assertGreater(
+            sample('http_request_phase_duration_seconds_sum',
+                   phase='serialize', **labels),
+            0,
+        )
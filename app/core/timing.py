@@ -0,0 +1,119 @@
+"""
+Per-request timing of database, serialization and rendering work.
+
+`ServerTimingMiddleware` starts a `RequestTimings` for each request. The
+database backend adds the duration of every query to it, the views
+using `ServerTimingMixin` add the time spent serializing, and the
+compression middleware the time spent compressing. Staff callers,
+or any caller with DEBUG set, get the timings in a `Server-Timing`
+header, and every request, phases included, is added to the Prometheus
+metrics.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from core import metrics
+
+
+class RequestTimings:
+    """Durations, in seconds, of the phases of a request."""
+    PHASES = ('serialize', 'render', 'compress')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+
+    def header(self, total):
+        """Return the `Server-Timing` header value of the request."""
+        entries = [f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"']
+        entries += [f'{phase};dur={duration * 1000:.2f}'
+                    for phase, duration in self.phases.items()]
+        entries.append(f'total;dur={total * 1000:.2f}')
+
+        return ', '.join(entries)
+
+
+_timings = ContextVar('request_timings', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the request timings."""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block, queries excluded, to `phase`."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    started, db = time.perf_counter(), timings.db
+    try:
+        yield
+    finally:
+        timings.phases[phase] += (time.perf_counter() - started
+                                  - (timings.db - db))
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """Time every request, and report it to staff in `Server-Timing`."""
+
+    def process_request(self, request):
+        _timings.set(RequestTimings())
+
+    def process_template_response(self, request, response):
+        """Render the response now, to time it."""
+        with timed('render'):
+            response.render()
+
+        return response
+
+    def process_response(self, request, response):
+        timings = _timings.get()
+        if timings is None:
+            return response
+        _timings.set(None)
+
+        total = time.perf_counter() - timings.started
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else None
+        metrics.observe_request(view_name, request.method,
+                                response.status_code, timings, total)
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = timings.header(total)
+
+        return response
+
+
+class ServerTimingMixin:
+    """Time the representations of the serializers of a DRF view."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+
+        def timed_representation(instance):
+            with timed('serialize'):
+                return to_representation(instance)
+
+        serializer.to_representation = timed_representation
+        return serializer
@@ -0,0 +1,127 @@
+"""
+Per-model catalog versions kept in the cache.
+
+Every write to a catalog model bumps the version of that model, so
+anything cached under a key built from the current versions is
+invalidated in O(1) without scanning or deleting cache entries.
+Versions are the time of the write in nanoseconds, which makes the
+newest version of a set of models their last modification time.
+
+Objects have versions too, for what is cached or validated about a
+single object: `object_versions` targets an object, and bumps naming the
+written objects leave the versions of the others alone.
+
+Versions only invalidate what other processes cache if they share the
+cache. With a process-local cache, such as the default LocMem, versions
+expire after CATALOG_LOCAL_VERSION_TIMEOUT seconds instead, which bounds
+how long a write made by another process, a command or a shell goes
+unseen.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.caching import is_process_local
+
+
+VERSION_KEY = 'catalog-version:{}'
+# Object version bumped by the writes that don't name their objects.
+ALL_OBJECTS = '*'
+
+_lock = threading.Lock()
+_last_version = 0
+
+
+def _version_key(target):
+    """Return the key of a model, or of a (model, pk) object, version."""
+    if isinstance(target, tuple):
+        model, pk = target
+        return f'{VERSION_KEY.format(model._meta.label_lower)}:{pk}'
+
+    return VERSION_KEY.format(target._meta.label_lower)
+
+
+def object_versions(model, pk):
+    """Return the version targets of an object, for `get_versions`."""
+    return [(model, ALL_OBJECTS), (model, str(pk))]
+
+
+def _new_version():
+    """Return a fresh version that can't collide with an older one."""
+    global _last_version
+    with _lock:
+        _last_version = max(time.time_ns(), _last_version + 1)
+        return _last_version
+
+
+def _version_timeout():
+    """Return the lifetime of the versions, None to keep them."""
+    if is_process_local():
+        return settings.CATALOG_LOCAL_VERSION_TIMEOUT
+
+    return None
+
+
+def get_versions(*targets):
+    """Return the current versions of the given targets, in order.
+
+    A target is a model, or a (model, pk) pair from `object_versions`.
+    """
+    keys = [_version_key(target) for target in targets]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            if not cache.add(key, version, timeout=_version_timeout()):
+                version = cache.get(key, version)
+            versions[key] = version
+
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*targets):
+    """Async counterpart of `get_versions`, using the async cache API."""
+    keys = [_version_key(target) for target in targets]
+    versions = await cache.aget_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            if not await cache.aadd(key, version,
+                                    timeout=_version_timeout()):
+                version = await cache.aget(key, version)
+            versions[key] = version
+
+    return [versions[key] for key in keys]
+
+
+def last_modified(versions):
+    """Return the modification timestamp, in seconds, of a set of versions."""
+    return max(versions) // 10 ** 9
+
+
+def _bump(keys):
+    version = _new_version()
+    cache.set_many({key: version for key in keys},
+                   timeout=_version_timeout())
+
+
+def bump_versions(*models, pks=None):
+    """Invalidate everything cached for the given models.
+
+    With `pks`, the written objects, only the versions of those objects
+    are bumped along with those of the models, else those of every
+    object. The versions are bumped right away and again once the
+    current transaction commits, so a response that a concurrent reader
+    cached from the pre-commit data is never served afterwards.
+    """
+    objects = [ALL_OBJECTS] if pks is None else [str(pk) for pk in pks]
+    keys = []
+    for model in models:
+        keys.append(_version_key(model))
+        keys += [_version_key((model, pk)) for pk in objects]
+    _bump(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(keys))
@@ -0,0 +1,176 @@
+"""
+Async read path of the catalog viewsets, for ASGI deployments.
+"""
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.utils.decorators import classonlymethod
+
+from rest_framework.response import Response
+
+from core.timing import timed
+from core.versioning import aget_versions
+
+from .cache import CatalogCacheMixin
+
+
+class AsyncCatalogReadMixin(CatalogCacheMixin):
+    """Serve the read actions of a cached catalog viewset asynchronously.
+
+    With `ASYNC_CATALOG_READS` set, which `app.asgi` does, the view of
+    each route is a coroutine. The `async_actions` are served on the
+    event loop: validators and cached responses go through the async
+    cache API, rows are fetched with the async ORM, and only the
+    authentication, the filter backends and renders other than JSON run
+    in a worker thread. Any other action falls back to the sync view in a
+    worker thread.
+    """
+    async_actions = ('list', 'retrieve')
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_CATALOG_READS:
+            return view
+
+        actions = view.actions
+        if 'get' in actions and 'head' not in actions:
+            actions['head'] = actions['get']
+        async_methods = {method for method, action in actions.items()
+                         if action in cls.async_actions}
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method.lower() not in async_methods:
+                return await sync_view(request, *args, **kwargs)
+
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+
+            return await self.adispatch(request, *args, **kwargs)
+
+        for attr in ('cls', 'initkwargs', 'actions', '__name__', '__doc__',
+                     '__module__'):
+            setattr(async_view, attr, getattr(view, attr))
+        async_view.csrf_exempt = True
+
+        return async_view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """Async counterpart of `dispatch` for the `async_actions`."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        self._async_response_cache_key = None
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await self._acached_response(handler, request,
+                                                    *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        entry = self._response_cache_entry(self._async_response_cache_key,
+                                           response)
+        if entry is not None:
+            await cache.aset(*entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        return await self._rendered(response)
+
+    @staticmethod
+    async def _rendered(response):
+        """Render a response, so Django doesn't render it in a thread.
+
+        JSON is rendered on the event loop from the serialized data. Other
+        renderers, such as the browsable API, which builds forms and may
+        query the database, render in the worker thread.
+        """
+        if not isinstance(response, Response):
+            return response
+
+        with timed('render'):
+            renderer = getattr(response, 'accepted_renderer', None)
+            if renderer is not None and renderer.format == 'json':
+                response.render()
+            else:
+                await sync_to_async(response.render)()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        rendered.shared_cacheable = getattr(response, 'shared_cacheable',
+                                            False)
+
+        return rendered
+
+    async def _acached_response(self, handler, request, *args, **kwargs):
+        """Async counterpart of `_cached_response`."""
+        if not self._shares_render(request):
+            return await handler(request, *args, **kwargs)
+
+        versions = await aget_versions(*self._cache_targets())
+        digest = self._fingerprint(request, versions)
+        self._read_fresh(versions)
+        not_modified = self._evaluate_preconditions(request, digest,
+                                                    versions)
+        if not_modified is not None:
+            self._count_lookup('not_modified')
+            return not_modified
+
+        key = f'catalog-response:{digest}'
+        cached = None
+        if settings.CATALOG_CACHE_TIMEOUT:
+            cached = await cache.aget(key)
+            self._count_lookup('miss' if cached is None else 'hit')
+
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = await handler(request, *args, **kwargs)
+            if settings.CATALOG_CACHE_TIMEOUT:
+                self._async_response_cache_key = key
+
+        return self._set_validators(response, digest, versions)
+
+    async def _afilter_queryset(self, queryset):
+        """Run the filter backends, which may query, in a worker thread."""
+        if not self.filter_backends:
+            return queryset
+
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def alist(self, request, *args, **kwargs):
+        """Async counterpart of `list`."""
+        queryset = await self._afilter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request,
+                                                       view=self)
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """Async counterpart of `retrieve`."""
+        queryset = await self._afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (queryset.model.DoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise Http404
+        self.check_object_permissions(request, instance)
+
+        return Response(self.get_serializer(instance).data)
@@ -0,0 +1,200 @@
+"""
+Response cache and conditional requests for the product API.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework.response import Response
+
+from core.compression import matching_etag
+from core.db.routing import may_be_stale, set_read_alias
+from core.metrics import cache_requests_total
+from core.timing import timed
+from core.versioning import get_versions, last_modified, object_versions
+
+
+class CatalogCacheMixin:
+    """Cache the rendered responses of the read actions of a viewset.
+
+    Entries are keyed by host, path, query string and negotiated media
+    type, plus catalog versions: those of `cache_models` for lists, and
+    for details those of their object and of `detail_cache_models`, the
+    models of its related objects. A write bumps the versions it touches,
+    so stale entries are never read again and simply expire, and a write
+    to another object leaves the validators of a detail alone.
+
+    The same fingerprint gives a strong `ETag` and the newest version a
+    `Last-Modified` date, so conditional reads are answered with a 304
+    before any query or serialization, and `If-Match` guards writes. The
+    ETags of the compressed codings, see `core.compression`, match too.
+
+    Only renders that are the same for every user are cached and
+    validated: HTML renders, such as the browsable API, show the user and
+    a CSRF token, so they are served by the handler every time.
+    """
+    cache_models = ()
+    detail_cache_models = ()
+
+    @staticmethod
+    def _shares_render(request):
+        """Return whether the render of a read may be shared by users."""
+        renderer = getattr(request, 'accepted_renderer', None)
+
+        return (renderer is not None
+                and not renderer.media_type.startswith('text/html'))
+
+    @staticmethod
+    def _fingerprint(request, versions):
+        """Return the digest identifying a representation."""
+        ident = '\n'.join([
+            request.get_host(),
+            request.get_full_path(),
+            request.accepted_media_type,
+            *map(str, versions),
+        ])
+
+        return hashlib.md5(ident.encode()).hexdigest()
+
+    def _cache_targets(self):
+        """Return the version targets of the representation requested."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg not in self.kwargs:
+            return self.cache_models
+
+        return [*object_versions(self.queryset.model,
+                                 self.kwargs[lookup_url_kwarg]),
+                *self.detail_cache_models]
+
+    def _get_fingerprint(self, request):
+        """Return the (digest, versions) identifying a representation."""
+        versions = get_versions(*self._cache_targets())
+
+        return self._fingerprint(request, versions), versions
+
+    def _set_validators(self, response, digest, versions):
+        """Add the ETag and Last-Modified headers to a response.
+
+        The response is marked as `shared_cacheable`, for the compressed
+        body cache of `core.compression`.
+        """
+        response['ETag'] = f'"{digest}"'
+        response['Last-Modified'] = http_date(last_modified(versions))
+        response.shared_cacheable = True
+
+        return response
+
+    def _evaluate_preconditions(self, request, digest, versions):
+        """Return the 304 or 412 response a request calls for, if any.
+
+        The preconditions may name the ETag of a compressed coding of the
+        representation, which a 304 then carries.
+        """
+        etag = matching_etag(request, f'"{digest}"')
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified(versions),
+        )
+        if response is not None and response.status_code == 304:
+            self._set_validators(response, digest, versions)
+            response['ETag'] = etag
+
+        return response
+
+    @staticmethod
+    def _read_fresh(versions):
+        """Read from the primary if a replica may lag behind `versions`.
+
+        Otherwise a stale read would be cached, and validated, under the
+        versions of writes it doesn't show.
+        """
+        if may_be_stale(max(versions)):
+            set_read_alias(None)
+
+    @staticmethod
+    def _count_lookup(result):
+        cache_requests_total.labels('catalog-response', result).inc()
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        """Answer a read from the validators, the cache or the handler."""
+        if not self._shares_render(request):
+            return handler(request, *args, **kwargs)
+
+        digest, versions = self._get_fingerprint(request)
+        self._read_fresh(versions)
+        not_modified = self._evaluate_preconditions(request, digest,
+                                                    versions)
+        if not_modified is not None:
+            self._count_lookup('not_modified')
+            return not_modified
+
+        key = f'catalog-response:{digest}'
+        cached = None
+        if settings.CATALOG_CACHE_TIMEOUT:
+            cached = cache.get(key)
+            self._count_lookup('miss' if cached is None else 'hit')
+
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = handler(request, *args, **kwargs)
+            if settings.CATALOG_CACHE_TIMEOUT:
+                self._response_cache_key = key
+
+        return self._set_validators(response, digest, versions)
+
+    def _guarded_write(self, handler, request, *args, **kwargs):
+        """Run a write only if the `If-Match` precondition holds."""
+        digest, versions = self._get_fingerprint(request)
+        failed = self._evaluate_preconditions(request, digest, versions)
+        if failed is not None:
+            return failed
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            self._set_validators(response, *self._get_fingerprint(request))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve,
+                                     request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        return self._guarded_write(super().update, request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return self._guarded_write(super().destroy, request, *args, **kwargs)
+
+    @staticmethod
+    def _response_cache_entry(key, response):
+        """Return the (key, value) to cache a read response under, if any."""
+        if (key is None
+                or not isinstance(response, Response)
+                or response.status_code != 200):
+            return None
+
+        with timed('render'):
+            response.render()
+        return key, (response.content, response['Content-Type'])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Store successful read responses once rendered."""
+        response = super().finalize_response(request, response,
+                                             *args, **kwargs)
+        entry = self._response_cache_entry(
+            getattr(self, '_response_cache_key', None), response,
+        )
+        if entry is not None:
+            cache.set(*entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        return response
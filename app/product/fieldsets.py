@@ -0,0 +1,103 @@
+"""
+Sparse fieldsets and expanded relations of the catalog read endpoints.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+class SparseFieldsetMixin:
+    """Let read requests choose the fields rendered with `fields` or `omit`.
+
+    `?fields=id,name` renders only those fields, `?omit=description`
+    every field but those. The serializer, which must use
+    `SparseFieldsMixin`, drops the other fields, and the view should
+    load only the `get_sparse_columns()` and prefetch only the relations
+    in `get_rendered_fields()`, so that the queries shrink with the
+    payload.
+
+    `?expand=resources` embeds the related objects of the relations in
+    the `expandable_fields` of the serializer instead of their primary
+    keys, and the view should then prefetch those objects whole.
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    expand_query_param = 'expand'
+
+    def _parse_names(self, param, available):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(available)
+        if unknown:
+            raise ValidationError({param: [
+                f'Unknown field: {name}.' for name in sorted(unknown)
+            ]})
+
+        return names
+
+    def get_sparse_fields(self):
+        """Return the names of the fields requested, None for all of them."""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            if self.request.method in SAFE_METHODS:
+                available = list(self.get_serializer_class()().fields)
+                fields = self._parse_names(self.fields_query_param, available)
+                omit = self._parse_names(self.omit_query_param, available)
+                if fields is not None or omit is not None:
+                    self._sparse_fields = [
+                        name for name in available
+                        if (fields is None or name in fields)
+                        and (omit is None or name not in omit)
+                    ]
+
+        return self._sparse_fields
+
+    def get_expanded_fields(self):
+        """Return the names of the relations to embed."""
+        if not hasattr(self, '_expanded_fields'):
+            self._expanded_fields = set()
+            if self.request.method in SAFE_METHODS:
+                self._expanded_fields = self._parse_names(
+                    self.expand_query_param,
+                    self.get_serializer_class().expandable_fields,
+                ) or set()
+
+        return self._expanded_fields
+
+    def get_rendered_fields(self):
+        """Return the names of the fields the response renders."""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return list(self.get_serializer_class()().fields)
+
+        return fields
+
+    def get_sparse_columns(self):
+        """Return the model columns read by the rendered fields."""
+        serializer = self.get_serializer_class()()
+        opts = serializer.Meta.model._meta
+        columns = [opts.pk.name]
+        for name in self.get_rendered_fields():
+            if name in serializer.column_sources:
+                columns += serializer.column_sources[name]
+                continue
+            try:
+                field = opts.get_field(serializer.fields[name].source
+                                       .split('.')[0])
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.append(field.name)
+
+        return list(dict.fromkeys(columns))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        context['expanded_fields'] = self.get_expanded_fields()
+
+        return context
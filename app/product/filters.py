@@ -0,0 +1,101 @@
+"""
+Filters for the product API.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import Product
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Filter on a comma separated list of numbers."""
+
+
+class ProductFilter(filters.FilterSet):
+    """Filter products by relations and price range.
+
+    Relation filters take comma separated ids and keep the products linked
+    to any of them. They are written as a subquery on the through table
+    rather than a join, so no `DISTINCT` is needed over the products.
+    """
+    tags = NumberInFilter(method='filter_related')
+    types = NumberInFilter(method='filter_related')
+    resources = NumberInFilter(method='filter_related')
+    price_min = filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = filters.NumberFilter(field_name='price', lookup_expr='lte')
+
+    class Meta:
+        model = Product
+        fields = ['tags', 'types', 'resources', 'price_min', 'price_max']
+
+    def filter_related(self, queryset, name, value):
+        """Keep the products linked to any of the given ids."""
+        field = Product._meta.get_field(name)
+        links = field.remote_field.through.objects.filter(**{
+            f'{field.m2m_reverse_field_name()}__in': value,
+        })
+
+        return queryset.filter(pk__in=links.values(field.m2m_field_name()))
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """Ranked full-text search over the product name and description.
+
+    Products are matched against their stored, weighted `search_document`
+    with the GIN index, and ranked from the stored vector, so no document
+    is rebuilt at query time. With `fuzzy` set, e.g. once a search came
+    back empty, the names are matched by trigram word similarity instead,
+    which catches typos and partial words: the trigram index finds the
+    candidates, and only the `fuzzy_limit` most similar are kept. Matches
+    are annotated with a `search_rank` that the catalog pagination orders
+    by.
+    """
+    search_param = 'search'
+    fuzzy_param = 'fuzzy'
+    fuzzy_limit = 100
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+
+        if request.query_params.get(self.fuzzy_param) in ('1', 'true'):
+            rank = TrigramWordSimilarity(terms, 'name')
+            candidates = (queryset.filter(name__trigram_word_similar=terms)
+                          .annotate(similarity=rank)
+                          .order_by('-similarity')
+                          .values('pk')[:self.fuzzy_limit])
+            matches = queryset.filter(pk__in=candidates)
+        else:
+            query = SearchQuery(terms, config='english',
+                                search_type='websearch')
+            matches = queryset.filter(search_document=query)
+            rank = SearchRank(F('search_document'), query)
+
+        # Ranks are single precision, and the cursor pagination needs them
+        # to survive a round trip through Python floats.
+        return matches.annotate(search_rank=Cast(rank, FloatField()))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over name and description.',
+            'schema': {'type': 'string'},
+        }, {
+            'name': self.fuzzy_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Match the search with the product names by '
+                           'trigram similarity, which tolerates typos.',
+            'schema': {'type': 'boolean'},
+        }]
@@ -0,0 +1,231 @@
+"""
+Background post-processing of uploaded images.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from PIL import Image, ImageOps, features
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from core.metrics import image_processing_duration, image_upload_bytes
+from core.models import (
+    ImageStatus,
+    content_file_path,
+    release_image_files,
+)
+from core.versioning import bump_versions
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class InlineExecutor:
+    """Executor running jobs in the calling thread, for local tests."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as exc:
+            future.set_exception(exc)
+
+        return future
+
+
+def get_executor():
+    """Return the executor configured by IMAGE_PROCESSING_EXECUTOR."""
+    global _executor
+    if settings.IMAGE_PROCESSING_EXECUTOR == 'inline':
+        return InlineExecutor()
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='image-processing',
+            )
+
+    return _executor
+
+
+def _set_status(model, pk, status, **filters):
+    """Update the image status of an object, return if it was updated."""
+    updated = (model.objects.filter(pk=pk, **filters)
+               .update(image_status=status))
+    if updated:
+        bump_versions(model, pks=[pk])
+
+    return bool(updated)
+
+
+def _decode(data):
+    """Decode an image upright, return it with its format."""
+    image = Image.open(BytesIO(data))
+    image_format = image.format or 'JPEG'
+    image.load()
+
+    return ImageOps.exif_transpose(image), image_format
+
+
+def _scaled(image, max_size):
+    """Return a copy of an image fitting in a `max_size` square."""
+    image = image.copy()
+    image.thumbnail((max_size, max_size))
+
+    return image
+
+
+def _encode(image, image_format):
+    """Encode an image, return its bytes."""
+    if image_format in ('JPEG', 'WEBP') and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    output = BytesIO()
+    options = {'optimize': True}
+    if image_format in ('JPEG', 'WEBP'):
+        options['quality'] = 85
+    image.save(output, format=image_format, **options)
+
+    return output.getvalue()
+
+
+def _variant_format():
+    """Return the format and extension used for the image variants."""
+    if features.check('webp'):
+        return 'WEBP', '.webp'
+
+    return 'JPEG', '.jpg'
+
+
+def _store(storage, name, data):
+    """Save a content addressed file unless it is already stored."""
+    if storage.exists(name):
+        return name
+
+    return storage.save(name, ContentFile(data))
+
+
+def _render(instance, storage, name, data):
+    """Store the processed image and its variants, return their names."""
+    image, image_format = _decode(data)
+    main = _scaled(image, settings.IMAGE_MAX_DIMENSION)
+    main_data = _encode(main, image_format)
+    digest = hashlib.sha256(main_data).hexdigest()
+    ext = os.path.splitext(name)[1].lower() or '.jpg'
+    image_name = _store(storage, content_file_path(instance, digest, ext),
+                        main_data)
+
+    variant_format, variant_ext = _variant_format()
+    variants = {}
+    for variant, size in sorted(settings.IMAGE_VARIANTS.items(),
+                                key=lambda item: item[1]):
+        if variants and size >= max(main.size):
+            break
+        variants[variant] = _store(
+            storage,
+            content_file_path(instance, digest, variant_ext, variant),
+            _encode(_scaled(main, size), variant_format),
+        )
+
+    return image_name, variants
+
+
+def process_image(model_label, pk, name, replaced=None):
+    """Post-process the image `name` stored on an object.
+
+    The processed image and its size-bounded variants are stored under
+    paths derived from their content, so identical uploads share their
+    files. The result is swapped in with a conditional UPDATE: readers
+    always see complete files and a late job never overwrites a newer
+    upload.
+
+    `replaced` is the (name, variants) of the image the upload replaced,
+    whose files are released once the job is over, unless an object uses
+    them, e.g. after uploading the same image again.
+    """
+    model = apps.get_model(model_label)
+    try:
+        _process_image(model, model_label, pk, name)
+    finally:
+        if replaced is not None:
+            release_image_files(model(pk=pk), *replaced)
+
+
+def _process_image(model, model_label, pk, name):
+    """Process the image, swap it in unless superseded by a new upload."""
+    if not _set_status(model, pk, ImageStatus.PROCESSING,
+                       image=name, image_status=ImageStatus.PENDING):
+        return
+
+    started = time.perf_counter()
+    try:
+        instance = model.objects.get(pk=pk)
+        storage = instance.image.storage
+        with storage.open(name, 'rb') as image_file:
+            image_name, variants = _render(instance, storage, name,
+                                           image_file.read())
+    except Exception:
+        logger.exception('Processing image %s of %s %s failed.',
+                         name, model_label, pk)
+        _set_status(model, pk, ImageStatus.FAILED, image=name)
+        image_processing_duration.labels(model_label, 'failed').observe(
+            time.perf_counter() - started
+        )
+        return
+
+    swapped = (model.objects
+               .filter(pk=pk, image=name, image_status=ImageStatus.PROCESSING)
+               .update(image=image_name, image_variants=variants,
+                       image_status=ImageStatus.READY))
+    if swapped:
+        bump_versions(model, pks=[pk])
+        storage.delete(name)
+    elif not model.objects.filter(image=image_name).exists():
+        for stored in [image_name, *variants.values()]:
+            storage.delete(stored)
+
+    image_processing_duration.labels(
+        model_label, 'ready' if swapped else 'superseded',
+    ).observe(time.perf_counter() - started)
+
+
+def _run_in_worker(*args):
+    """Run a job in a pool thread with its own database connection."""
+    close_old_connections()
+    try:
+        process_image(*args)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_processing(instance, replaced=None):
+    """Process the image of a saved object once the upload is committed.
+
+    `replaced` is the (name, variants) of the image the upload replaced.
+    """
+    args = (instance._meta.label, instance.pk, instance.image.name,
+            replaced)
+    image_upload_bytes.labels(instance._meta.label).observe(
+        instance.image.size
+    )
+
+    def submit():
+        executor = get_executor()
+        if isinstance(executor, InlineExecutor):
+            executor.submit(process_image, *args)
+        else:
+            executor.submit(_run_in_worker, *args)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,144 @@
+"""
+Bulk import of products.
+"""
+from django.db import transaction
+
+from rest_framework.exceptions import ParseError
+
+from core.models import (
+    Product,
+    Product_type,
+    Tag,
+    Resource,
+)
+from core.versioning import bump_versions
+from product.serializers import ProductImportSerializer
+
+
+class ProductImporter:
+    """Validate and insert product payloads in chunked transactions.
+
+    Each chunk is validated row by row without touching the database,
+    then written with one query per table: the referenced resources are
+    checked at once, missing types and tags are bulk created, and the
+    products and their through-table rows are inserted with `bulk_create`.
+    A chunk is committed in its own transaction, so a failure only loses
+    the chunk being written.
+    """
+    default_chunk_size = 500
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or self.default_chunk_size
+
+    def run(self, rows):
+        """Import an iterable of product payloads and return a report."""
+        report = {'created': 0, 'errors': []}
+        chunk = []
+        for index, row in enumerate(rows):
+            chunk.append((index, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk, report)
+                chunk = []
+
+        if chunk:
+            self._import_chunk(chunk, report)
+
+        return report
+
+    @staticmethod
+    def _names(data, key):
+        """Return the distinct related names of a row, in order."""
+        return list(dict.fromkeys(item['name'] for item in data.get(key) or []))
+
+    @classmethod
+    def _related_ids(cls, data, key, objects):
+        """Return the distinct ids of the related objects of a row."""
+        return list(dict.fromkeys(objects[name].pk
+                                  for name in cls._names(data, key)))
+
+    @staticmethod
+    def _resource_ids(data):
+        """Return the distinct resource ids of a row, in order."""
+        return list(dict.fromkeys(data.get('resources') or []))
+
+    def _validate(self, chunk, report):
+        """Return the (index, validated_data) pairs of the valid rows."""
+        valid = []
+        for index, row in chunk:
+            if isinstance(row, ParseError):
+                errors = {'non_field_errors': [str(row.detail)]}
+            elif not isinstance(row, dict):
+                errors = {'non_field_errors': ['Expected a JSON object.']}
+            else:
+                serializer = ProductImportSerializer(data=row)
+                if serializer.is_valid():
+                    valid.append((index, serializer.validated_data))
+                    continue
+                errors = serializer.errors
+
+            report['errors'].append({'row': index, 'errors': errors})
+
+        resource_ids = {pk for _, data in valid
+                        for pk in self._resource_ids(data)}
+        if not resource_ids:
+            return valid
+
+        existing = set(Resource.objects.filter(pk__in=resource_ids)
+                       .values_list('pk', flat=True))
+        checked = []
+        for index, data in valid:
+            unknown = [pk for pk in self._resource_ids(data)
+                       if pk not in existing]
+            if unknown:
+                report['errors'].append({'row': index, 'errors': {
+                    'resources': [f'Invalid pk "{pk}" - object does not exist.'
+                                  for pk in unknown],
+                }})
+            else:
+                checked.append((index, data))
+
+        return checked
+
+    def _import_chunk(self, chunk, report):
+        """Write the valid rows of a chunk in a single transaction."""
+        valid = self._validate(chunk, report)
+        if not valid:
+            return
+
+        rows = [data for _, data in valid]
+        with transaction.atomic():
+            types = Product_type.objects.get_or_create_by_names(
+                name for data in rows for name in self._names(data, 'types')
+            )
+            tags = Tag.objects.get_or_create_by_names(
+                name for data in rows for name in self._names(data, 'tags')
+            )
+            products = Product.objects.bulk_create([
+                Product(**{key: value for key, value in data.items()
+                           if key not in ('types', 'tags', 'resources')})
+                for data in rows
+            ])
+
+            type_links, tag_links, resource_links = [], [], []
+            for product, data in zip(products, rows):
+                type_links += [
+                    Product.types.through(product_id=product.pk,
+                                          product_type_id=pk)
+                    for pk in self._related_ids(data, 'types', types)
+                ]
+                tag_links += [
+                    Product.tags.through(product_id=product.pk, tag_id=pk)
+                    for pk in self._related_ids(data, 'tags', tags)
+                ]
+                resource_links += [
+                    Product.resources.through(product_id=product.pk,
+                                              resource_id=pk)
+                    for pk in self._resource_ids(data)
+                ]
+
+            Product.types.through.objects.bulk_create(type_links)
+            Product.tags.through.objects.bulk_create(tag_links)
+            Product.resources.through.objects.bulk_create(resource_links)
+            bump_versions(Product, pks=[product.pk for product in products])
+
+        report['created'] += len(products)
@@ -0,0 +1,31 @@
+"""
+Pagination for the product API.
+"""
+from asgiref.sync import sync_to_async
+
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Keyset pagination over the primary key with an opaque cursor.
+
+    Pages are fetched with `WHERE id > <cursor> ORDER BY id LIMIT n`, so
+    every page costs the same and no `COUNT(*)` is ever issued. Async
+    views fetch pages through `apaginate_queryset`.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        """Order searches by relevance, with the id breaking ties."""
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', 'id')
+
+        return super().get_ordering(request, queryset, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of `paginate_queryset`."""
+        return await sync_to_async(self.paginate_queryset)(queryset, request,
+                                                           view)
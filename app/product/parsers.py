@@ -0,0 +1,33 @@
+"""
+Parsers for the product API.
+"""
+import json
+
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline delimited JSON lazily, one object per line.
+
+    Returns a generator so the request body is consumed line by line.
+    Lines that are not valid JSON are yielded as `ParseError` instances
+    to let the caller report them without aborting the whole stream.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        return (self._load(line, encoding)
+                for line in stream if line.strip())
+
+    def _load(self, line, encoding):
+        """Decode a single line."""
+        try:
+            return json.loads(line.decode(encoding))
+        except ValueError as exc:
+            return ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,103 @@
+"""
+Renderers for the product API.
+"""
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingRenderer(BaseRenderer):
+    """Base renderer able to encode an iterable of rows incrementally."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single object, used for error responses."""
+        if data is None:
+            return b''
+
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.render_stream(rows))
+
+    def render_stream(self, rows):
+        """Yield the encoded rows one at a time."""
+        raise NotImplementedError('Subclasses must implement render_stream()')
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Render rows as newline delimited JSON."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render_stream(self, rows):
+        for row in rows:
+            line = json.dumps(row, cls=JSONEncoder, ensure_ascii=False)
+            yield (line + '\n').encode(self.charset)
+
+
+class JSONArrayRenderer(StreamingRenderer):
+    """Render rows as a JSON array, encoded one row at a time.
+
+    The bytes are those `JSONRenderer` gives for the whole list, but only
+    one row is held encoded at once.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    json_renderer = JSONRenderer()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single object, used for error responses."""
+        return self.json_renderer.render(data)
+
+    def render_stream(self, rows):
+        yield b'['
+        separator = b''
+        for row in rows:
+            yield separator + self.json_renderer.render(row)
+            separator = b','
+        yield b']'
+
+
+class _Echo:
+    """Writer returning what is written, to stream `csv` output."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(StreamingRenderer):
+    """Render rows as CSV, with a header taken from the first row.
+
+    Lists are flattened into a single `|` separated cell, using the
+    `name` of nested objects and the value of scalars. Objects are
+    written as JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    @staticmethod
+    def _cell(value):
+        """Flatten a value into a CSV cell."""
+        if isinstance(value, list):
+            return '|'.join(
+                str(item['name'] if isinstance(item, dict) else item)
+                for item in value
+            )
+        if isinstance(value, dict):
+            return json.dumps(value, cls=JSONEncoder)
+        if value is None:
+            return ''
+
+        return value
+
+    def render_stream(self, rows):
+        writer = csv.writer(_Echo())
+        header = None
+        for row in rows:
+            if header is None:
+                header = list(row)
+                yield writer.writerow(header).encode(self.charset)
+            yield writer.writerow(
+                [self._cell(row.get(key)) for key in header]
+            ).encode(self.charset)
@@ -0,0 +1,200 @@
+"""
+Read-only fast path rendering products from `values()` rows.
+
+On large list pages the DRF field machinery dominates: every field of
+every row goes through `get_attribute` and `to_representation`, and every
+type and tag through a nested serializer. `ProductRowSerializer` renders
+the same representation as the product serializers from plain dicts
+instead: the product columns come from `values()`, and the related
+objects of a whole page are loaded into lists with one query per
+relation, like the prefetches they replace.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query import ValuesIterable
+
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from core.models import Product
+
+from .serializers import ImageVariantsField
+
+
+# Relations rendered as nested {id, name} objects rather than keys.
+NESTED_RELATIONS = ('types', 'tags')
+
+
+class ProductRowIterable(ValuesIterable):
+    """Yield product rows with the lists of their `relations`."""
+    relations = ()
+
+    def __iter__(self):
+        rows = list(super().__iter__())
+        if not rows:
+            return iter(rows)
+
+        ids = {row['id'] for row in rows}
+        db = self.queryset.db
+        for relation in self.relations:
+            related = {product_id: [] for product_id in ids}
+            model = Product._meta.get_field(relation).related_model
+            # Joined like the prefetch of the relation, which gives the
+            # items in the same order.
+            items = model.objects.using(db).filter(product__in=ids)
+            if relation in NESTED_RELATIONS:
+                for product_id, pk, name in items.values_list('product', 'id',
+                                                              'name'):
+                    related[product_id].append({'id': pk, 'name': name})
+            else:
+                for product_id, pk in items.values_list('product', 'id'):
+                    related[product_id].append(pk)
+            for row in rows:
+                row[relation] = related[row['id']]
+
+        return iter(rows)
+
+
+@lru_cache(maxsize=None)
+def _row_iterable(relations):
+    return type(ProductRowIterable.__name__, (ProductRowIterable,),
+                {'relations': relations})
+
+
+def product_rows(queryset, columns, relations):
+    """Return `queryset` as rows of `columns` and of `relations` lists."""
+    queryset = queryset.values(*columns)
+    # Kept by the clones of the filters, the pagination and `get()`.
+    queryset._iterable_class = _row_iterable(tuple(relations))
+
+    return queryset
+
+
+class ProductRowSerializer:
+    """Render product rows like a product serializer, read-only.
+
+    `serializer` is the product serializer, with its context, whose
+    representation is rendered. Use `supports` to check it first: only
+    fields read from a single column, the nested types and tags, and the
+    resource keys have a fast path.
+    """
+
+    def __init__(self, serializer, instance=None, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.readers = [(name, *self._reader(serializer, name, field))
+                        for name, field in serializer.fields.items()]
+
+    @classmethod
+    def supports(cls, serializer):
+        """Return whether every field of `serializer` has a fast path."""
+        return all(cls._reader(serializer, name, field) is not None
+                   for name, field in serializer.fields.items())
+
+    @staticmethod
+    def _reader(serializer, name, field):
+        """Return the (row key, converter) of a field, None if unsupported.
+
+        A converter of None renders the value of the row as it is.
+        """
+        if name in NESTED_RELATIONS:
+            if (isinstance(field, serializers.ListSerializer)
+                    and list(field.child.fields) == ['id', 'name']):
+                return name, None
+            return None
+        if name == 'resources':
+            if (isinstance(field, serializers.ManyRelatedField)
+                    and isinstance(field.child_relation,
+                                   serializers.PrimaryKeyRelatedField)
+                    and field.child_relation.pk_field is None):
+                return name, None
+            return None
+        if isinstance(field, serializers.SerializerMethodField):
+            columns = serializer.column_sources.get(name, ())
+            return (columns[0], None) if len(columns) == 1 else None
+        if isinstance(field, serializers.BaseSerializer):
+            return None
+        if isinstance(field, ImageVariantsField):
+            return field.source, field.to_representation
+        if isinstance(field, serializers.FileField):
+            return field.source, ProductRowSerializer._file_url(field)
+        try:
+            model_field = Product._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if model_field.concrete and not model_field.many_to_many:
+            return field.source, field.to_representation
+
+        return None
+
+    @staticmethod
+    def _file_url(field):
+        """Return the converter of a file field, given the file name."""
+        storage = Product._meta.get_field(field.source).storage
+        request = field.context.get('request', None)
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+        def to_representation(name):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return to_representation
+
+    def _render(self, row):
+        ret = {}
+        for name, key, convert in self.readers:
+            value = row[key]
+            ret[name] = (value if convert is None or value is None
+                         else convert(value))
+
+        return ret
+
+    def to_representation(self, instance):
+        if self.many:
+            return [self._render(row) for row in instance]
+
+        return self._render(instance)
+
+    @property
+    def data(self):
+        return self.to_representation(self.instance)
+
+
+class ProductRowReadMixin:
+    """Serve the JSON `row_actions` of a product viewset from rows.
+
+    The viewset's `get_queryset` must return `product_rows()` when
+    `renders_rows()`. Other renderers, such as the browsable API, which
+    needs real serializers for its forms, keep the DRF serializers.
+    """
+    row_actions = ('list', 'retrieve')
+
+    def renders_rows(self):
+        """Return whether the response is rendered from rows."""
+        if not hasattr(self, '_renders_rows'):
+            renderer = getattr(self.request, 'accepted_renderer', None)
+            self._renders_rows = bool(
+                settings.CATALOG_ROW_SERIALIZATION
+                and self.action in self.row_actions
+                and renderer is not None and renderer.format == 'json'
+                and ProductRowSerializer.supports(self.get_serializer_class()(
+                    context=self.get_serializer_context()
+                ))
+            )
+
+        return self._renders_rows
+
+    def get_serializer(self, *args, **kwargs):
+        if not self.renders_rows():
+            return super().get_serializer(*args, **kwargs)
+
+        kwargs.setdefault('context', self.get_serializer_context())
+        serializer = self.get_serializer_class()(context=kwargs['context'])
+
+        return ProductRowSerializer(serializer, *args, **kwargs)
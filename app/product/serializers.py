@@ -1,18 +1,117 @@
 """
 Serializers for Products API.
 """
+from django.core.files.storage import default_storage
+from django.db import transaction
+
 from rest_framework import serializers
 
 from core.models import (
+    ImageStatus,
     Product,
     Product_type,
     Rating,
     Tag,
-    Resource
+    Resource,
+    release_image_files,
 )
 
 
-class Product_typeSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.Field):
+    """Read-only map of the image variants of an object to their URLs.
+
+    With `variant` given, renders the URL of that variant only.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def bind(self, field_name, parent):
+        if self.source is None and field_name != 'image_variants':
+            self.source = 'image_variants'
+        super().bind(field_name, parent)
+
+    def to_representation(self, variants):
+        request = self.context.get('request', None)
+        urls = {}
+        for name, path in variants.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+
+        if self.variant is not None:
+            return urls.get(self.variant)
+
+        return urls
+
+
+class UniqueNameMixin:
+    """Reject names already taken by another object, whatever their case.
+
+    Only applies when the serializer writes the object itself. Nested in
+    a product, an existing name is a reference to reuse, not a conflict.
+    """
+
+    def validate_name(self, value):
+        if self.root is not self:
+            return value
+
+        taken = self.Meta.model.objects.filter_names([value])
+        if self.instance is not None:
+            taken = taken.exclude(pk=self.instance.pk)
+        if taken.exists():
+            raise serializers.ValidationError(
+                f'{self.Meta.model._meta.verbose_name.capitalize()} with this '
+                f'name already exists.'
+            )
+
+        return value
+
+
+class SparseFieldsMixin:
+    """Render only the fields named in the `sparse_fields` context, and
+    embed the related objects named in the `expanded_fields` context.
+
+    Only the serializer at the root of the representation, or the child
+    of a root list, is changed: nested serializers keep all their fields.
+    `column_sources` names the model columns read by the fields whose
+    source isn't a model field, such as method fields.
+    `expandable_fields` maps the relations that may be embedded instead
+    of rendered as primary keys to the serializer embedding them, fields
+    already nested being left as they are.
+    """
+    column_sources = {}
+    expandable_fields = {}
+
+    def _is_root(self):
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, serializers.ListSerializer)
+            and parent.parent is None
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root():
+            return fields
+
+        for name in self.context.get('expanded_fields') or ():
+            if isinstance(fields[name], serializers.BaseSerializer):
+                continue
+            many = isinstance(fields[name], serializers.ManyRelatedField)
+            fields[name] = self.expandable_fields[name](many=many,
+                                                        read_only=True)
+
+        names = self.context.get('sparse_fields')
+        if names is None:
+            return fields
+
+        return {name: field for name, field in fields.items()
+                if name in names}
+
+
+class Product_typeSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for product types."""
 
     class Meta:
@@ -30,7 +129,18 @@ class RatingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'product', 'user']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class RatingSubmitSerializer(serializers.Serializer):
+    """Serializer for a rating submitted by the requesting user.
+
+    Products are checked for existence by the upsert itself, once per
+    request, instead of once per item.
+    """
+    product = serializers.IntegerField(min_value=1)
+    value = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class TagSerializer(SparseFieldsMixin, UniqueNameMixin,
+                    serializers.ModelSerializer):
     """Serializer for the tag objects."""
 
     class Meta:
@@ -39,21 +149,25 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ResourceSerializer(serializers.ModelSerializer):
+class ResourceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for the resource objects."""
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Resource
-        fields = ['id', 'name', 'price', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'price', 'image', 'image_status',
+                  'image_variants']
+        read_only_fields = ['id', 'image_status']
 
     def update(self, instance, validated_data):
         """Manage updating resource."""
         image = validated_data.get('image', 'not_exists')
         if image is None:
             validated_data.pop('image')
-            instance.image.delete(save=True)
+            release_image_files(instance)
             instance.image = None
+            instance.image_status = ImageStatus.NONE
+            instance.image_variants = {}
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -63,13 +177,17 @@ class ResourceSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for products."""
     types = Product_typeSerializer(many=True, required=False)
     tags = TagSerializer(many=True, required=False)
     resources = serializers.PrimaryKeyRelatedField(many=True,
                                                    queryset=Resource.objects.all(),
                                                    required=False)
+    thumbnail = ImageVariantsField(variant='thumbnail')
+    expandable_fields = {'types': Product_typeSerializer,
+                         'tags': TagSerializer,
+                         'resources': ResourceSerializer}
 
     class Meta:
         model = Product
@@ -78,7 +196,8 @@ class ProductSerializer(serializers.ModelSerializer):
                   'price',
                   'types',
                   'tags',
-                  'resources']
+                  'resources',
+                  'thumbnail']
         read_only_fields = ['id']
         extra_kwargs = {'types': {'allow_null': True,
                                   'allow_blank': True,
@@ -87,16 +206,21 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def _get_or_create_types(self, types, product):
         """Handle getting or creating types as needed."""
-        for type in types:
-            type_obj, created = Product_type.objects.get_or_create(**type)
-            product.types.add(type_obj)
+        type_objs = Product_type.objects.get_or_create_by_names(
+            type['name'] for type in types
+        )
+        if type_objs:
+            product.types.add(*type_objs.values())
 
     def _get_or_create_tags(self, tags, product):
         """Handle gatting or creating tags as needed."""
-        for tag in tags:
-            tag_obj, _ = Tag.objects.get_or_create(**tag)
-            product.tags.add(tag_obj)
+        tag_objs = Tag.objects.get_or_create_by_names(
+            tag['name'] for tag in tags
+        )
+        if tag_objs:
+            product.tags.add(*tag_objs.values())
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create product."""
         types = validated_data.pop('types', None)
@@ -115,6 +239,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
         return product
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update product."""
         types = validated_data.pop('types', None)
@@ -130,14 +255,16 @@ class ProductSerializer(serializers.ModelSerializer):
         resources = validated_data.pop('resources', None)
         if resources is not None:
             instance.resources.clear()
-            for resource in resources:
-                instance.resources.add(resource)
+            if resources:
+                instance.resources.add(*resources)
 
         image = validated_data.get('image', 'not_exists')
         if image is None:
             validated_data.pop('image')
-            instance.image.delete(save=True)
+            release_image_files(instance)
             instance.image = None
+            instance.image_status = ImageStatus.NONE
+            instance.image_variants = {}
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -147,12 +274,31 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
 
 
+class ProductImportSerializer(ProductSerializer):
+    """Serializer validating one row of a bulk product import.
+
+    Resources are checked for existence once per chunk by the importer
+    instead of once per row.
+    """
+    resources = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+    )
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['description']
+
+
 class ProductDetailSerializer(ProductSerializer):
     """Serializer for recipe detail view."""
     rating = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+    column_sources = {'rating': ['rating_avg']}
 
     class Meta(ProductSerializer.Meta):
-        fields = ProductSerializer.Meta.fields + ['description', 'rating', 'image']
+        fields = ProductSerializer.Meta.fields + ['description', 'rating', 'image',
+                                                  'image_status', 'image_variants']
+        read_only_fields = ProductSerializer.Meta.read_only_fields + ['image_status']
 
     def get_rating(self, obj):
         return obj.rating
@@ -163,8 +309,8 @@ class ProductImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_status']
+        read_only_fields = ['id', 'image_status']
         extra_kwargs = {'image': {'required': 'True'}}
 
 
@@ -173,7 +319,7 @@ class ResourceImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Resource
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_status']
+        read_only_fields = ['id', 'image_status']
         extra_kwargs = {'image': {'required': 'True'}}
 
@@ -0,0 +1,151 @@
+"""
+Tests for the async read path of the catalog viewsets.
+"""
+import asyncio
+from decimal import Decimal
+import json
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.test import APIClient
+
+from core.models import Product, Tag
+
+from product.views import ProductViewSet
+
+
+PRODUCTS_URL = reverse('product:product-list')
+
+
+def detail_url(product_id):
+    """Create and return a product detail URL."""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_product(**params):
+    """Create and return a sample product."""
+    defaults = {'name': 'Product', 'price': Decimal('10')}
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+@override_settings(ASYNC_CATALOG_READS=True)
+def async_view(actions):
+    """Create and return the async view of the product viewset."""
+    return ProductViewSet.as_view(actions)
+
+
+class AsyncCatalogReadTests(TestCase):
+    """Test the async views answer like the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.product = create_product(name='First')
+        self.product.tags.add(Tag.objects.create(name='Tag'))
+        create_product(name='Second')
+
+    def test_view_async_only_when_enabled(self):
+        """Test the view is a coroutine only with the setting enabled."""
+        self.assertTrue(
+            asyncio.iscoroutinefunction(async_view({'get': 'list'}))
+        )
+        self.assertFalse(
+            asyncio.iscoroutinefunction(
+                ProductViewSet.as_view({'get': 'list'})
+            )
+        )
+
+    async def test_list_matches_sync_view(self):
+        """Test the async list returns the body of the sync list."""
+        expected = await sync_to_async(
+            lambda: self.client.get(PRODUCTS_URL, {'page_size': 1}).content
+        )()
+        cache.clear()
+        view = async_view({'get': 'list'})
+
+        res = await view(self.factory.get(PRODUCTS_URL, {'page_size': 1}))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), json.loads(expected))
+        self.assertIsNotNone(json.loads(res.content)['next'])
+
+    async def test_retrieve_matches_sync_view(self):
+        """Test the async detail returns the body of the sync detail."""
+        url = detail_url(self.product.id)
+        expected = await sync_to_async(
+            lambda: self.client.get(url).content
+        )()
+        cache.clear()
+        view = async_view({'get': 'retrieve'})
+
+        res = await view(self.factory.get(url), pk=str(self.product.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), json.loads(expected))
+
+    async def test_retrieve_missing_product(self):
+        """Test an unknown or malformed id is not found."""
+        view = async_view({'get': 'retrieve'})
+
+        for pk in ('0', 'abc'):
+            res = await view(self.factory.get(detail_url(1)), pk=pk)
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_conditional_request_not_modified(self):
+        """Test a matching If-None-Match is answered with 304."""
+        view = async_view({'get': 'list'})
+        first = await view(self.factory.get(PRODUCTS_URL))
+
+        res = await view(self.factory.get(
+            PRODUCTS_URL, **{'If-None-Match': first['ETag']},
+        ))
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], first['ETag'])
+
+    async def test_head_served_async(self):
+        """Test HEAD requests are answered by the list action."""
+        view = async_view({'get': 'list'})
+
+        res = await view(self.factory.head(PRODUCTS_URL))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', res)
+
+    async def test_write_falls_back_to_sync_view(self):
+        """Test actions outside the async ones run the sync view."""
+        view = async_view({'get': 'list', 'post': 'create'})
+
+        res = await view(self.factory.post(
+            PRODUCTS_URL, {'name': 'New'}, content_type='application/json',
+        ))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_browsable_api_rendered_off_event_loop(self):
+        """Test HTML renders, which may query the database, run in a thread."""
+        view = async_view({'get': 'list'})
+        render = BrowsableAPIRenderer.render
+
+        def querying_render(renderer, *args, **kwargs):
+            Product.objects.count()
+            return render(renderer, *args, **kwargs)
+
+        with patch.object(BrowsableAPIRenderer, 'render', querying_render):
+            res = await view(self.factory.get(
+                PRODUCTS_URL, **{'Accept': 'text/html'},
+            ))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('text/html', res['Content-Type'])
+        self.assertIn(b'First', res.content)
@@ -0,0 +1,270 @@
+"""
+Tests for the catalog response cache.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Product,
+    Rating,
+    Tag,
+)
+
+
+PRODUCTS_URL = reverse('product:product-list')
+TAGS_URL = reverse('product:tag-list')
+
+
+def detail_url(product_id):
+    """Create and return a product detail URL."""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def get_json(client, url, **params):
+    """Get an URL and return its status code and decoded body."""
+    res = client.get(url, params)
+    return res.status_code, json.loads(res.content)
+
+
+class CatalogCacheTests(TestCase):
+    """Test read responses are cached and invalidated on writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.staff_client = APIClient()
+        self.staff_client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email='superuser@example.com',
+                password='pass123',
+            )
+        )
+        self.product = Product.objects.create(name='Product',
+                                              price=Decimal('10'))
+
+    def test_repeated_read_served_from_cache(self):
+        """Test a repeated read runs no query and returns the same body."""
+        first = self.client.get(PRODUCTS_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(PRODUCTS_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['Content-Type'], second['Content-Type'])
+
+    def test_query_string_is_part_of_key(self):
+        """Test different query strings are cached separately."""
+        Product.objects.create(name='Other', price=Decimal('10'))
+
+        _, full = get_json(self.client, PRODUCTS_URL)
+        _, page = get_json(self.client, PRODUCTS_URL, page_size=1)
+
+        self.assertEqual(len(full['results']), 2)
+        self.assertEqual(len(page['results']), 1)
+
+    def test_m2m_update_invalidates_detail(self):
+        """Test changing product tags invalidates the cached detail."""
+        url = detail_url(self.product.id)
+        get_json(self.client, url)
+
+        res = self.staff_client.patch(url, {'tags': [{'name': 'Fimo'}]},
+                                      format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        _, data = get_json(self.client, url)
+        self.assertEqual([tag['name'] for tag in data['tags']], ['Fimo'])
+
+    def test_tags_created_by_product_invalidate_tag_list(self):
+        """Test tags created through a product invalidate the tag list."""
+        _, data = get_json(self.client, TAGS_URL)
+        self.assertEqual(data['results'], [])
+
+        self.staff_client.patch(detail_url(self.product.id),
+                                {'tags': [{'name': 'Playa'}]}, format='json')
+
+        _, data = get_json(self.client, TAGS_URL)
+        self.assertEqual([tag['name'] for tag in data['results']], ['Playa'])
+
+    def test_rating_invalidates_product_detail(self):
+        """Test a new rating invalidates the cached product rating."""
+        url = detail_url(self.product.id)
+        _, data = get_json(self.client, url)
+        self.assertIsNone(data['rating'])
+
+        user = get_user_model().objects.create_user('user@example.com',
+                                                    'testpass123')
+        Rating.objects.create(user=user, product=self.product, value=4)
+
+        _, data = get_json(self.client, url)
+        self.assertEqual(data['rating'], 4)
+
+    def test_delete_invalidates_list(self):
+        """Test deleting an object invalidates the cached list."""
+        tag = Tag.objects.create(name='Playa')
+        get_json(self.client, TAGS_URL)
+
+        tag.delete()
+
+        _, data = get_json(self.client, TAGS_URL)
+        self.assertEqual(data['results'], [])
+
+    def test_html_renders_not_shared(self):
+        """Test a staff browsable API render isn't served to anyone else."""
+        staff = self.staff_client.get(PRODUCTS_URL, HTTP_ACCEPT='text/html')
+        self.assertIn(b'superuser@example.com', staff.content)
+
+        res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT='text/html')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn(b'superuser@example.com', res.content)
+        self.assertNotIn('ETag', res)
+
+    @override_settings(CATALOG_LOCAL_VERSION_TIMEOUT=5)
+    def test_unseen_write_shows_once_versions_expire(self):
+        """Test a write missed by a process-local cache shows in time."""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+        # As written by another process, which bumps its own cache only.
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+
+        _, data = get_json(self.client, url)
+        self.assertEqual(data['name'], 'Product')
+
+        later = time.time() + 6
+        with patch('django.core.cache.backends.locmem.time.time',
+                   return_value=later):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content)['name'], 'Renamed')
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        """Test a zero timeout disables the response cache."""
+        self.client.get(PRODUCTS_URL)
+
+        with self.assertNumQueries(4):
+            self.client.get(PRODUCTS_URL)
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag and Last-Modified handling of the catalog endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.staff_client = APIClient()
+        self.staff_client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email='superuser@example.com',
+                password='pass123',
+            )
+        )
+        self.product = Product.objects.create(name='Product',
+                                              price=Decimal('10'))
+
+    def test_validators_on_catalog_endpoints(self):
+        """Test read responses carry an ETag and a Last-Modified date."""
+        tag = Tag.objects.create(name='Playa')
+        for url in (PRODUCTS_URL, detail_url(self.product.id), TAGS_URL,
+                    reverse('product:tag-detail', args=[tag.id]),
+                    reverse('product:product_type-list'),
+                    reverse('product:resource-list')):
+            with self.subTest(url=url):
+                res = self.client.get(url)
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertTrue(res['ETag'].startswith('"'))
+                self.assertIn('Last-Modified', res)
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without any query."""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_if_modified_since_returns_not_modified(self):
+        """Test an up to date If-Modified-Since gets a 304."""
+        last_modified = self.client.get(PRODUCTS_URL)['Last-Modified']
+
+        res = self.client.get(PRODUCTS_URL,
+                              HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_write(self):
+        """Test a write changes the ETag of the product representations."""
+        url = detail_url(self.product.id)
+        etag = self.client.get(url)['ETag']
+
+        self.staff_client.patch(url, {'tags': [{'name': 'Fimo'}]},
+                                format='json')
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_if_match_on_update(self):
+        """Test updates only apply when If-Match holds."""
+        url = detail_url(self.product.id)
+        etag = self.staff_client.get(url)['ETag']
+
+        res = self.staff_client.patch(url, {'name': 'New'}, format='json',
+                                      HTTP_IF_MATCH='"stale"')
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'Product')
+
+        res = self.staff_client.patch(url, {'name': 'New'}, format='json',
+                                      HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'New')
+        self.assertEqual(self.staff_client.get(url)['ETag'], res['ETag'])
+
+    def test_if_match_ignores_other_objects(self):
+        """Test writes to other products leave If-Match on a product."""
+        url = detail_url(self.product.id)
+        etag = self.staff_client.get(url)['ETag']
+        other = Product.objects.create(name='Other', price=Decimal('5'))
+        other.name = 'Renamed'
+        other.save()
+        Rating.objects.create(
+            user=get_user_model().objects.create_user('user@example.com',
+                                                      'testpass123'),
+            product=other, value=4,
+        )
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+
+        res = self.staff_client.patch(url, {'name': 'New'}, format='json',
+                                      HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.staff_client.patch(url, {'name': 'Newer'}, format='json',
+                                      HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_list_validators_follow_every_product(self):
+        """Test the list ETag changes with a write to any product."""
+        etag = self.client.get(PRODUCTS_URL)['ETag']
+
+        Product.objects.create(name='Other', price=Decimal('5'))
+
+        self.assertNotEqual(self.client.get(PRODUCTS_URL)['ETag'], etag)
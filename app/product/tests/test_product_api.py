@@ -2,26 +2,38 @@
 Tests for product API.
 """
 from decimal import Decimal
+from unittest.mock import patch
+import csv
+import io
+import json
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import signals
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
+from core.asgi import ASGIHandler
 from core.models import (
+    ImageStatus,
     Product,
     Product_type,
     Rating,
     Tag,
-    Resource
+    Resource,
+    release_image_files,
 )
 
+from product.pagination import CatalogCursorPagination
 from product.serializers import (
     ProductSerializer,
     ProductDetailSerializer,
@@ -29,6 +41,8 @@ from product.serializers import (
 
 
 PRODUCTS_URL = reverse('product:product-list')
+IMPORT_URL = reverse('product:product-bulk-import')
+EXPORT_URL = reverse('product:product-export')
 
 
 def detail_url(product_id):
@@ -84,7 +98,43 @@ class PublicProductAPITests(TestCase):
         products = Product.objects.all().order_by('id')
         serializer = ProductSerializer(products, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_products_cursor_pagination(self):
+        """Test products are paginated by cursor without counting rows."""
+        products = [create_product(name=f'Product{i}') for i in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PRODUCTS_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+        self.assertEqual([p['id'] for p in res.data['results']],
+                         [p.id for p in products[:2]])
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+        ids = [p['id'] for p in res.data['results']]
+        next_url = res.data['next']
+        while next_url:
+            res = self.client.get(next_url)
+            ids += [p['id'] for p in res.data['results']]
+            next_url = res.data['next']
+
+        self.assertEqual(ids, [p.id for p in products])
+
+    def test_products_page_size_capped(self):
+        """Test the requested page size is capped."""
+        with patch.object(CatalogCursorPagination, 'max_page_size', 2):
+            for i in range(3):
+                create_product(name=f'Product{i}')
+
+            res = self.client.get(PRODUCTS_URL, {'page_size': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
 
     def test_create_product_error(self):
         """Test unauthenticated users can't create products."""
@@ -356,15 +406,73 @@ class PrivateProductsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['resources'], [])
 
+    def test_create_with_existing_and_new_tags(self):
+        """Test creating a product reuses existing tags and types."""
+        tag = Tag.objects.create(name='Fimo')
+        product_type = Product_type.objects.create(name='Bracelet')
+        payload = {
+            'name': 'Test Product',
+            'price': Decimal('350'),
+            'types': [{'name': 'Bracelet'}, {'name': 'Necklace'}],
+            'tags': [{'name': 'Fimo'}, {'name': 'Rose'}, {'name': 'Fimo'}],
+        }
+
+        res = self.staff_client.post(PRODUCTS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=res.data['id'])
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Product_type.objects.count(), 2)
+        self.assertIn(tag, product.tags.all())
+        self.assertIn(product_type, product.types.all())
+        self.assertEqual(product.tags.count(), 2)
+
+    def test_create_reuses_tags_differing_by_case(self):
+        """Test tags and types are matched ignoring case."""
+        tag = Tag.objects.create(name='Fimo')
+        product_type = Product_type.objects.create(name='Bracelet')
+        payload = {
+            'name': 'Test Product',
+            'price': Decimal('350'),
+            'types': [{'name': 'bracelet'}],
+            'tags': [{'name': 'FIMO'}, {'name': 'fimo'}],
+        }
+
+        res = self.staff_client.post(PRODUCTS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(id=res.data['id'])
+        self.assertEqual(list(product.tags.all()), [tag])
+        self.assertEqual(list(product.types.all()), [product_type])
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_create_queries_independent_of_tag_count(self):
+        """Test product creation cost doesn't grow with its tags and types."""
+        def create_with(count):
+            payload = {
+                'name': f'Product {count}',
+                'price': Decimal('350'),
+                'types': [{'name': f'Type {count}-{i}'} for i in range(count)],
+                'tags': [{'name': f'Tag {count}-{i}'} for i in range(count)],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.staff_client.post(PRODUCTS_URL, payload,
+                                             format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(create_with(1), create_with(20))
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
 
-    def generate_image_post_response(self, product_id, client):
+    def generate_image_post_response(self, product_id, client,
+                                     color='black'):
         """Generate image, post it to a product and return response."""
         url = image_upload_url(product_id)
         with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
-            img = Image.new('RGB', (10, 10))
+            img = Image.new('RGB', (10, 10), color)
             img.save(image_file, format='JPEG')
             image_file.seek(0)
             payload = {"image": image_file}
@@ -384,17 +492,143 @@ class ImageUploadTests(TestCase):
             create_staff_client(email='superuser1@example.com')
 
     def tearDown(self):
-        self.product.image.delete()
+        self.product.image.delete(save=False)
 
     def test_upload_image(self):
         """Test uploading an image to a product."""
         res = self.generate_image_post_response(self.product.id, self.staff_client)
 
         self.product.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.product.image.path))
 
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline',
+                       IMAGE_MAX_DIMENSION=20)
+    def test_upload_image_processed_in_background(self):
+        """Test the uploaded image is resized after the upload commits."""
+        url = image_upload_url(self.product.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (100, 50)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks() as callbacks:
+                res = self.staff_client.post(url, {'image': image_file},
+                                             format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], ImageStatus.PENDING)
+        self.product.refresh_from_db()
+        original_path = self.product.image.path
+
+        for callback in callbacks:
+            callback()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, ImageStatus.READY)
+        self.assertFalse(os.path.exists(original_path))
+        with Image.open(self.product.image.path) as img:
+            self.assertEqual(img.size, (20, 10))
+        release_image_files(self.product)
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline')
+    @patch('product.images._decode', side_effect=OSError('broken'))
+    def test_upload_image_processing_failure(self, patched_decode):
+        """Test a failing image job marks the image as failed."""
+        with self.assertLogs('product.images', level='ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(self.product.id,
+                                              self.staff_client)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, ImageStatus.FAILED)
+        self.assertTrue(os.path.exists(self.product.image.path))
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline',
+                       IMAGE_VARIANTS={'thumbnail': 4, 'small': 8})
+    def test_processed_image_variants(self):
+        """Test processing stores variants exposed as URLs."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(self.product.id,
+                                              self.staff_client)
+
+        self.product.refresh_from_db()
+        self.assertEqual(set(self.product.image_variants),
+                         {'thumbnail', 'small'})
+        with self.product.image.storage.open(
+                self.product.image_variants['thumbnail']) as variant:
+            with Image.open(variant) as img:
+                self.assertEqual(img.size, (4, 4))
+
+        res = self.client.get(detail_url(self.product.id))
+        self.assertTrue(
+            res.data['image_variants']['small'].endswith('/small.webp'))
+        res = self.client.get(PRODUCTS_URL)
+        self.assertTrue(
+            res.data['results'][0]['thumbnail'].endswith('/thumbnail.webp'))
+        release_image_files(self.product)
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline')
+    def test_identical_images_share_files(self):
+        """Test identical uploads are stored once and deleted last."""
+        other = create_product(name='Other product')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(self.product.id,
+                                              self.staff_client)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(other.id, self.staff_client)
+
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.product.image.name, other.image.name)
+        self.assertEqual(self.product.image_variants, other.image_variants)
+
+        image_path = other.image.path
+        self.staff_client.delete(detail_url(other.id))
+        self.assertTrue(os.path.exists(image_path))
+
+        self.staff_client.delete(detail_url(self.product.id))
+        self.assertFalse(os.path.exists(image_path))
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline',
+                       IMAGE_VARIANTS={'thumbnail': 4})
+    def test_reupload_releases_replaced_image(self):
+        """Test uploading a new image deletes the files it replaces."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(self.product.id,
+                                              self.staff_client)
+        self.product.refresh_from_db()
+        storage = self.product.image.storage
+        old_files = [self.product.image.name,
+                     *self.product.image_variants.values()]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generate_image_post_response(self.product.id,
+                                              self.staff_client,
+                                              color='white')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, ImageStatus.READY)
+        self.assertNotIn(self.product.image.name, old_files)
+        for name in old_files:
+            self.assertFalse(storage.exists(name))
+        self.assertTrue(storage.exists(
+            self.product.image_variants['thumbnail']
+        ))
+        release_image_files(self.product)
+
+    @override_settings(IMAGE_PROCESSING_EXECUTOR='inline')
+    def test_reupload_same_image_keeps_files(self):
+        """Test uploading the same image again keeps its shared files."""
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.generate_image_post_response(self.product.id,
+                                                  self.staff_client)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_status, ImageStatus.READY)
+        self.assertTrue(os.path.exists(self.product.image.path))
+        release_image_files(self.product)
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
         url = image_upload_url(self.product.id)
@@ -428,3 +662,217 @@ class ImageUploadTests(TestCase):
         self.assertFalse(os.path.exists(image_path))
 
 
+class BulkImportTests(TestCase):
+    """Tests for the bulk product import API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.superuser, self.staff_client = \
+            create_staff_client(email='superuser1@example.com')
+
+    def test_non_staff_import_forbidden(self):
+        """Test non-staff users can't import products."""
+        res = self.client.post(IMPORT_URL, [{'name': 'P', 'price': '1'}],
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Product.objects.exists())
+
+    def test_import_json_array(self):
+        """Test importing a JSON array of products with their relations."""
+        resource = Resource.objects.create(name='Fimo')
+        Tag.objects.create(name='Playa')
+        payload = [
+            {'name': 'Product 1', 'price': '10.00', 'description': 'One',
+             'types': [{'name': 'Bracelet'}], 'tags': [{'name': 'Playa'}],
+             'resources': [resource.id]},
+            {'name': 'Product 2', 'price': '20.00',
+             'tags': [{'name': 'Playa'}, {'name': 'Set'}, {'name': 'PLAYA'}]},
+        ]
+
+        res = self.staff_client.post(IMPORT_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'created': 2, 'errors': []})
+        product1 = Product.objects.get(name='Product 1')
+        self.assertEqual(product1.description, 'One')
+        self.assertEqual([t.name for t in product1.types.all()], ['Bracelet'])
+        self.assertEqual([r.id for r in product1.resources.all()],
+                         [resource.id])
+        product2 = Product.objects.get(name='Product 2')
+        self.assertEqual(product2.tags.count(), 2)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_import_reports_row_errors(self):
+        """Test invalid rows are reported and valid rows still imported."""
+        payload = [
+            {'name': 'Valid', 'price': '10.00'},
+            {'name': 'No price'},
+            {'name': 'Bad resource', 'price': '1.00', 'resources': [999]},
+            'not an object',
+        ]
+
+        res = self.staff_client.post(IMPORT_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        errors = {error['row']: error['errors'] for error in res.data['errors']}
+        self.assertEqual(set(errors), {1, 2, 3})
+        self.assertIn('price', errors[1])
+        self.assertIn('resources', errors[2])
+        self.assertEqual([p.name for p in Product.objects.all()], ['Valid'])
+
+    def test_import_ndjson_stream(self):
+        """Test importing an NDJSON stream in several chunks."""
+        lines = [json.dumps({'name': f'Product {i}', 'price': '5.00',
+                             'tags': [{'name': f'Tag {i % 2}'}]})
+                 for i in range(5)]
+        lines.insert(2, '{not json')
+        body = '\n'.join(lines) + '\n'
+
+        res = self.staff_client.post(f'{IMPORT_URL}?chunk_size=2', body,
+                                     content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 5)
+        self.assertEqual([error['row'] for error in res.data['errors']], [2])
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Product.objects.filter(tags__name='Tag 0').count(), 3)
+
+    def test_import_rejects_non_list(self):
+        """Test importing something else than a list fails."""
+        res = self.staff_client.post(IMPORT_URL, {'name': 'Product'},
+                                     format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportTests(TestCase):
+    """Tests for the streaming catalog export API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = []
+        for i in range(3):
+            product = create_product(name=f'Product {i}')
+            product.tags.add(Tag.objects.create(name=f'Tag {i}'))
+            product.types.add(Product_type.objects.create(name=f'Type {i}'))
+            product.resources.add(Resource.objects.create(name=f'Res {i}'))
+            self.products.append(product)
+
+    def test_export_ndjson(self):
+        """Test exporting the catalog as NDJSON."""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        expected = ProductDetailSerializer(
+            Product.objects.order_by('id'), many=True,
+            context={'request': res.wsgi_request},
+        ).data
+        self.assertEqual(rows, json.loads(json.dumps(expected)))
+
+    async def test_export_under_asgi(self):
+        """Test the streamed export reads the database under ASGI."""
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        # As the test clients do, keep the connection of the test case.
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+        try:
+            await ASGIHandler()({
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': EXPORT_URL,
+                'raw_path': EXPORT_URL.encode(),
+                'query_string': b'',
+                'headers': [(b'host', b'testserver')],
+                'server': ('testserver', 80),
+                'client': ('127.0.0.1', 0),
+            }, receive, send)
+        finally:
+            signals.request_started.connect(close_old_connections)
+            signals.request_finished.connect(close_old_connections)
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        self.assertFalse(messages[-1].get('more_body', False))
+        content = b''.join(message.get('body', b'')
+                           for message in messages[1:])
+        names = [json.loads(line)['name']
+                 for line in content.decode().splitlines()]
+        self.assertEqual(names, ['Product 0', 'Product 1', 'Product 2'])
+
+    def test_export_csv(self):
+        """Test exporting the catalog as CSV."""
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['name'], 'Product 0')
+        self.assertEqual(rows[0]['tags'], 'Tag 0')
+        self.assertEqual(rows[0]['types'], 'Type 0')
+        self.assertEqual(rows[0]['resources'],
+                         str(self.products[0].resources.get().id))
+
+    def test_export_json_array(self):
+        """Test exporting the catalog as the JSON array of the details."""
+        res = self.client.get(EXPORT_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        expected = ProductDetailSerializer(
+            Product.objects.order_by('id'), many=True,
+            context={'request': res.wsgi_request},
+        ).data
+        self.assertEqual(b''.join(res.streaming_content),
+                         JSONRenderer().render(expected))
+
+    def test_export_json_streams_rows(self):
+        """Test the JSON array is written one product at a time."""
+        res = self.client.get(EXPORT_URL, {'format': 'json'})
+
+        chunks = list(res.streaming_content)
+
+        self.assertEqual(chunks[0], b'[')
+        self.assertEqual(chunks[-1], b']')
+        self.assertEqual(len(chunks), 2 + len(self.products))
+
+    def test_export_filtered(self):
+        """Test the export takes the filters of the list."""
+        tag = self.products[1].tags.get()
+
+        res = self.client.get(EXPORT_URL, {'format': 'json', 'tags': tag.id})
+
+        rows = json.loads(b''.join(res.streaming_content))
+        self.assertEqual([row['id'] for row in rows], [self.products[1].id])
+
+    def test_export_prefetches_per_chunk(self):
+        """Test the export query count depends on chunks, not on rows."""
+        with patch('product.views.ProductViewSet.export_chunk_size', 2):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(EXPORT_URL)
+                b''.join(res.streaming_content)
+
+        # One products query, then three prefetches for each of 2 chunks.
+        self.assertEqual(len(queries), 1 + 3 * 2)
@@ -0,0 +1,210 @@
+"""
+Tests for filtering and searching products.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Product,
+    Product_type,
+    Tag,
+    Resource,
+)
+
+from product.filters import ProductSearchFilter
+
+
+PRODUCTS_URL = reverse('product:product-list')
+
+
+def create_product(**params):
+    """Create and return a sample product."""
+    defaults = {
+        'name': 'Sample product name',
+        'price': Decimal('10'),
+        'description': 'Sample description',
+    }
+    defaults.update(params)
+
+    return Product.objects.create(**defaults)
+
+
+def result_names(res):
+    """Return the names of the products of a list response."""
+    return [product['name'] for product in res.data['results']]
+
+
+class ProductFilterTests(TestCase):
+    """Test filtering products by relations and price."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_filter_by_tags(self):
+        """Test filtering products linked to any of the given tags."""
+        fimo, playa, other = (Tag.objects.create(name=name)
+                              for name in ('Fimo', 'Playa', 'Other'))
+        product1 = create_product(name='Earrings')
+        product1.tags.add(fimo, playa)
+        product2 = create_product(name='Bracelet')
+        product2.tags.add(playa)
+        create_product(name='Ring').tags.add(other)
+
+        res = self.client.get(PRODUCTS_URL, {'tags': f'{fimo.id},{playa.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(result_names(res), ['Earrings', 'Bracelet'])
+
+    def test_filter_by_types_and_resources(self):
+        """Test filtering products by type and resource."""
+        necklace = Product_type.objects.create(name='Necklace')
+        silver = Resource.objects.create(name='Silver')
+        product1 = create_product(name='Chain')
+        product1.types.add(necklace)
+        product1.resources.add(silver)
+        product2 = create_product(name='Choker')
+        product2.types.add(necklace)
+
+        res = self.client.get(PRODUCTS_URL, {'types': necklace.id,
+                                             'resources': silver.id})
+
+        self.assertEqual(result_names(res), ['Chain'])
+
+    def test_filter_by_price_range(self):
+        """Test filtering products by minimum and maximum price."""
+        for price in ('5', '10', '20', '40'):
+            create_product(name=price, price=Decimal(price))
+
+        res = self.client.get(PRODUCTS_URL, {'price_min': '10',
+                                             'price_max': '20'})
+
+        self.assertEqual(result_names(res), ['10', '20'])
+
+    def test_invalid_filter_value(self):
+        """Test an invalid filter value returns an error."""
+        res = self.client.get(PRODUCTS_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTests(TestCase):
+    """Test ranked full-text search of products."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_search_name_and_description(self):
+        """Test searching matches stemmed words of name and description."""
+        create_product(name='Silver earrings', description='Handmade.')
+        create_product(name='Necklace', description='Chain of silver links.')
+        create_product(name='Bracelet', description='Leather strap.')
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'silvers'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(result_names(res),
+                              ['Silver earrings', 'Necklace'])
+
+    def test_search_without_fuzzy_has_no_fallback(self):
+        """Test a typo matches nothing unless fuzzy matching is asked for."""
+        create_product(name='Bracelet')
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'braclet'})
+
+        self.assertEqual(result_names(res), [])
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """Test fuzzy search matches a misspelt word of the name."""
+        create_product(name='Leather bracelet')
+        create_product(name='Necklace')
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'bracelt',
+                                             'fuzzy': '1'})
+
+        self.assertEqual(result_names(res), ['Leather bracelet'])
+
+    def test_fuzzy_search_is_bounded(self):
+        """Test fuzzy search keeps only the most similar names."""
+        create_product(name='Bracelet')
+        create_product(name='Bracelets')
+        create_product(name='Bracelet set')
+
+        with patch.object(ProductSearchFilter, 'fuzzy_limit', 1):
+            res = self.client.get(PRODUCTS_URL, {'search': 'bracelet',
+                                                 'fuzzy': '1'})
+
+        self.assertEqual(len(result_names(res)), 1)
+
+    def test_search_ranks_results(self):
+        """Test better matches are returned first, across pages."""
+        create_product(name='Ring', description='Goes well with earrings.')
+        create_product(name='Earrings', description='Earrings in a box.')
+        create_product(name='Earrings set', description='Two earrings.')
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'earrings',
+                                             'page_size': 2})
+        names = result_names(res)
+        res = self.client.get(res.data['next'])
+        names += result_names(res)
+
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-1], 'Ring')
+        self.assertIsNone(res.data['next'])
+
+    def test_search_combined_with_filters(self):
+        """Test searching within a price range."""
+        create_product(name='Silver ring', price=Decimal('10'))
+        create_product(name='Silver chain', price=Decimal('50'))
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'silver',
+                                             'price_max': '20'})
+
+        self.assertEqual(result_names(res), ['Silver ring'])
+
+    def test_search_document_follows_updates(self):
+        """Test the stored search document is rebuilt on every write."""
+        product = create_product(name='Ring', description='Plain.')
+        product.description = 'Engraved with silver.'
+        product.save()
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'silver'})
+
+        self.assertEqual(result_names(res), ['Ring'])
+
+    def test_search_name_ranks_above_description(self):
+        """Test a match on the name ranks above one on the description."""
+        create_product(name='Ring', description='Silver.')
+        create_product(name='Silver', description='Ring.')
+
+        res = self.client.get(PRODUCTS_URL, {'search': 'silver'})
+
+        self.assertEqual(result_names(res), ['Silver', 'Ring'])
+
+    def plan(self, **params):
+        """Return the query plan of a search, with sequential scans off."""
+        queryset = ProductSearchFilter().filter_queryset(
+            type('Request', (), {'query_params': params}),
+            Product.objects.all(),
+            None,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+
+    def test_search_uses_indexes(self):
+        """Test both search paths are served by their GIN indexes."""
+        create_product(name='Silver ring')
+
+        self.assertIn('product_search_idx', self.plan(search='silver'))
+        self.assertIn('product_name_trgm_idx',
+                      self.plan(search='silvr', fuzzy='1'))
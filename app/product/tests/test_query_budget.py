@@ -0,0 +1,93 @@
+"""
+Query budget tests for the product API.
+
+Every read endpoint has a fixed number of queries that must not grow with
+the number of rows returned or with the size of the related sets.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Product,
+    Product_type,
+    Rating,
+    Tag,
+    Resource,
+)
+
+
+def create_catalog(size):
+    """Create `size` fully related products and return them."""
+    products = []
+    for i in range(size):
+        product = Product.objects.create(name=f'Product {i}',
+                                         price=Decimal('10'),
+                                         description='Description')
+        product.types.add(
+            Product_type.objects.create(name=f'Type {product.id}')
+        )
+        product.tags.add(Tag.objects.create(name=f'Tag {product.id}'),
+                         Tag.objects.create(name=f'Other tag {product.id}'))
+        product.resources.add(Resource.objects.create(name=f'Resource {i}'))
+        user = get_user_model().objects.create_user(
+            f'user{product.id}@example.com',
+            'testpass123',
+        )
+        Rating.objects.create(user=user, product=product, value=i % 5 + 1)
+        products.append(product)
+
+    return products
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class QueryBudgetTests(TestCase):
+    """Test the read endpoints keep a row-count independent query budget."""
+
+    # Budgets per endpoint, for anonymous requests.
+    BUDGETS = {
+        'product:product-list': 4,
+        'product:product-detail': 4,
+        'product:product_type-list': 1,
+        'product:product_type-detail': 1,
+        'product:rating-list': 1,
+        'product:tag-list': 1,
+        'product:tag-detail': 1,
+        'product:resource-list': 1,
+        'product:resource-detail': 1,
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertBudget(self, url_name, args=None):
+        """Request an endpoint and assert it stays within its budget."""
+        with self.assertNumQueries(self.BUDGETS[url_name]):
+            res = self.client.get(reverse(url_name, args=args))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_budgets_independent_of_rows(self):
+        """Test list endpoints cost the same for 1 and for 10 rows."""
+        for size in (1, 10):
+            with self.subTest(size=size):
+                create_catalog(size)
+                for url_name in self.BUDGETS:
+                    if url_name.endswith('-list'):
+                        self.assertBudget(url_name)
+
+    def test_detail_budgets(self):
+        """Test detail endpoints stay within their budget."""
+        product = create_catalog(3)[0]
+
+        self.assertBudget('product:product-detail', [product.id])
+        self.assertBudget('product:product_type-detail',
+                          [product.types.first().id])
+        self.assertBudget('product:tag-detail', [product.tags.first().id])
+        self.assertBudget('product:resource-detail',
+                          [product.resources.first().id])
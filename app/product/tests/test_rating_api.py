@@ -19,6 +19,7 @@ from decimal import Decimal
 
 
 RATING_URL = reverse('product:rating-list')
+BULK_RATING_URL = reverse('product:rating-bulk-rate')
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -62,10 +63,10 @@ class PublicRatingTests(TestCase):
 
         res = self.client.get(RATING_URL)
 
-        ratings = Rating.objects.all()
+        ratings = Rating.objects.all().order_by('id')
         serializer = RatingSerializer(ratings, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_unauthenticated_rate_fail(self):
         """Test unauthenticated users can't rate products."""
@@ -116,3 +117,107 @@ class PrivateRatingTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['value'], payload['value'])
+
+    def test_rate_product(self):
+        """Test rating a product creates the rating of the user."""
+        product = Product.objects.create(name='Test Product',
+                                         price=Decimal('200'))
+
+        res = self.client.post(RATING_URL, {'product': product.id, 'value': 4},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        rating = Rating.objects.get(user=self.user, product=product)
+        self.assertEqual(res.data, RatingSerializer(rating).data)
+        product.refresh_from_db()
+        self.assertEqual(product.rating, 4)
+
+    def test_rerate_product_updates_rating(self):
+        """Test rating a product again replaces the previous rating."""
+        product = Product.objects.create(name='Test Product',
+                                         price=Decimal('200'))
+        other = create_user(email='other@example.com')
+        Rating.objects.create(user=other, product=product, value=5)
+        Rating.objects.create(user=self.user, product=product, value=1)
+
+        res = self.client.post(RATING_URL, {'product': product.id, 'value': 3},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['value'], 3)
+        self.assertEqual(Rating.objects.filter(user=self.user).count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 2)
+        self.assertEqual(product.rating_sum, 8)
+        self.assertEqual(product.rating, 4)
+
+    def test_rate_unknown_product_fails(self):
+        """Test rating a product that doesn't exist returns an error."""
+        res = self.client.post(RATING_URL, {'product': 999, 'value': 3},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product', res.data)
+        self.assertFalse(Rating.objects.exists())
+
+    def test_bulk_rate(self):
+        """Test rating many products at once keeps the aggregates exact."""
+        products = [Product.objects.create(name=f'Product {i}',
+                                           price=Decimal('10'))
+                    for i in range(3)]
+        Rating.objects.create(user=self.user, product=products[0], value=1)
+        payload = [
+            {'product': products[0].id, 'value': 5},
+            {'product': products[1].id, 'value': 2},
+            {'product': products[2].id, 'value': 1},
+            {'product': products[2].id, 'value': 4},
+        ]
+
+        res = self.client.post(BULK_RATING_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['value'] for item in res.data], [5, 2, 4])
+        for product, expected in zip(products, [5, 2, 4]):
+            product.refresh_from_db()
+            self.assertEqual(product.rating_count, 1)
+            self.assertEqual(product.rating, expected)
+
+    def test_bulk_rate_query_count_is_constant(self):
+        """Test the number of queries doesn't grow with the ratings."""
+        products = [Product.objects.create(name=f'Product {i}',
+                                           price=Decimal('10'))
+                    for i in range(20)]
+        payload = [{'product': product.id, 'value': 3}
+                   for product in products]
+
+        with self.assertNumQueries(8):
+            res = self.client.post(BULK_RATING_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 20)
+
+    def test_bulk_rate_invalid_items(self):
+        """Test invalid items reject the whole submission."""
+        product = Product.objects.create(name='Test Product',
+                                         price=Decimal('200'))
+        payload = [{'product': product.id, 'value': 3},
+                   {'product': product.id, 'value': 9}]
+
+        res = self.client.post(BULK_RATING_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Rating.objects.exists())
+
+    def test_bulk_rate_unknown_product_rolls_back(self):
+        """Test an unknown product leaves every rating untouched."""
+        product = Product.objects.create(name='Test Product',
+                                         price=Decimal('200'))
+        payload = [{'product': product.id, 'value': 3},
+                   {'product': 999, 'value': 3}]
+
+        res = self.client.post(BULK_RATING_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Rating.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 0)
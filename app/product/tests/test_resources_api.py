@@ -62,10 +62,10 @@ class PublicResourceAPITest(TestCase):
 
         res = self.client.get(RESOURCES_URL)
 
-        resources = Resource.objects.all()
+        resources = Resource.objects.all().order_by('id')
         serializer = ResourceSerializer(resources, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_resource_create_error(self):
         """Test unauthenticated user create resources results in error."""
@@ -233,7 +233,7 @@ class ImageUploadTests(TestCase):
         res = self.generate_image_post_response(self.resource.id, self.staff_client)
 
         self.resource.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.resource.image.path))
 
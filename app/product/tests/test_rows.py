@@ -0,0 +1,151 @@
+"""
+Tests for the row serialization fast path of the product API.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    ImageStatus,
+    Product,
+    Product_type,
+    Tag,
+    Resource,
+)
+
+from product.rows import ProductRowSerializer
+from product.views import ProductViewSet
+
+
+PRODUCTS_URL = reverse('product:product-list')
+
+
+def detail_url(product_id):
+    """Create and return a product detail URL."""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_catalog():
+    """Create products covering every field of the representations."""
+    shared_tag = Tag.objects.create(name='Shared')
+    resource = Resource.objects.create(name='Resource', price=Decimal('2'))
+    products = []
+    for i in range(5):
+        product = Product.objects.create(
+            name=f'Product {i}',
+            price=Decimal('12.5') + i,
+            description=f'Description of product {i}',
+        )
+        product.types.add(Product_type.objects.create(name=f'Type {i}'))
+        product.tags.add(Tag.objects.create(name=f'Tag {i}'), shared_tag)
+        product.resources.add(resource)
+        products.append(product)
+
+    with_image = products[0]
+    with_image.image = 'uploads/product/image.jpg'
+    with_image.image_status = ImageStatus.READY
+    with_image.image_variants = {
+        'thumbnail': 'uploads/product/image-thumbnail.webp',
+        'medium': 'uploads/product/image-medium.webp',
+    }
+    with_image.save()
+    Product.objects.filter(pk=products[1].pk).update(
+        rating_avg=3.5, rating_count=2, rating_sum=7,
+    )
+    Product.objects.create(name='Bare product', price=Decimal('1'))
+
+    return products
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class ProductRowSerializationTests(TestCase):
+    """Test rows render the bytes of the DRF serializers."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = create_catalog()
+
+    def assertSameBody(self, url, data=None):
+        """Assert rows and serializers give the same response body."""
+        with override_settings(CATALOG_ROW_SERIALIZATION=False):
+            expected = self.client.get(url, data)
+        with patch.object(ProductRowSerializer, 'to_representation',
+                          autospec=True,
+                          side_effect=ProductRowSerializer.to_representation
+                          ) as rows:
+            res = self.client.get(url, data)
+
+        self.assertEqual(res.status_code, expected.status_code)
+        self.assertTrue(rows.called)
+        self.assertEqual(res.content, expected.content)
+
+        return res
+
+    def test_list_matches_serializers(self):
+        """Test list pages match, the following pages included."""
+        res = self.assertSameBody(PRODUCTS_URL, {'page_size': 2})
+
+        self.assertSameBody(res.data['next'])
+
+    def test_detail_matches_serializers(self):
+        """Test details match, with and without image and rating."""
+        for product in self.products[:2]:
+            self.assertSameBody(detail_url(product.id))
+
+    def test_filtered_list_matches_serializers(self):
+        """Test filtered, searched and trimmed lists match."""
+        tag = Tag.objects.get(name='Shared')
+        for data in ({'tags': tag.id, 'price_min': 13},
+                     {'search': 'product'},
+                     {'fields': 'name,tags'},
+                     {'omit': 'types,thumbnail'}):
+            with self.subTest(data=data):
+                self.assertSameBody(PRODUCTS_URL, data)
+
+    def test_trimmed_detail_matches_serializers(self):
+        """Test details with sparse fields match."""
+        self.assertSameBody(detail_url(self.products[1].id),
+                            {'fields': 'id,rating,image,resources'})
+
+    def test_same_queries_as_prefetches(self):
+        """Test rows load the relations with one query each."""
+        with self.assertNumQueries(4):
+            self.client.get(PRODUCTS_URL)
+
+    def test_expanded_resources_use_serializers(self):
+        """Test embedded resources go through the DRF serializers."""
+        with patch.object(ProductRowSerializer, 'to_representation') as rows:
+            res = self.client.get(PRODUCTS_URL, {'expand': 'resources'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(rows.called)
+
+    def test_browsable_api_uses_serializers(self):
+        """Test the browsable API keeps the serializers for its forms."""
+        with patch.object(ProductRowSerializer, 'to_representation') as rows:
+            res = self.client.get(PRODUCTS_URL, HTTP_ACCEPT='text/html')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(rows.called)
+
+    async def test_async_list_matches_serializers(self):
+        """Test the async list renders the bytes of the serializers."""
+        with override_settings(CATALOG_ROW_SERIALIZATION=False):
+            expected = await sync_to_async(
+                lambda: self.client.get(PRODUCTS_URL).content
+            )()
+        with override_settings(ASYNC_CATALOG_READS=True):
+            view = ProductViewSet.as_view({'get': 'list'})
+
+        res = await view(AsyncRequestFactory().get(PRODUCTS_URL))
+
+        self.assertEqual(res.content, expected)
@@ -0,0 +1,202 @@
+"""
+Tests for the sparse fieldsets and expanded relations of the catalog
+endpoints.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Product,
+    Product_type,
+    Tag,
+    Resource,
+)
+
+
+PRODUCTS_URL = reverse('product:product-list')
+RESOURCES_URL = reverse('product:resource-list')
+TAGS_URL = reverse('product:tag-list')
+
+
+def detail_url(product_id):
+    """Create and return a product detail URL."""
+    return reverse('product:product-detail', args=[product_id])
+
+
+def create_product(**params):
+    """Create and return a product with a type, a tag and a resource."""
+    defaults = {
+        'name': 'Sample product',
+        'price': Decimal('5.25'),
+        'description': 'Sample description',
+    }
+    defaults.update(params)
+    product = Product.objects.create(**defaults)
+    product.types.add(Product_type.objects.create(name=f'Type {product.id}'))
+    product.tags.add(Tag.objects.create(name=f'Tag {product.id}'))
+    product.resources.add(Resource.objects.create(name=f'Res {product.id}'))
+
+    return product
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class SparseFieldsetTests(TestCase):
+    """Test the fields and omit query parameters."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+
+    def test_fields_trim_payload(self):
+        """Test only the requested fields are rendered, in their order."""
+        res = self.client.get(detail_url(self.product.id),
+                              {'fields': 'price,id,name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data), ['id', 'name', 'price'])
+
+    def test_omit_trims_payload(self):
+        """Test omitted fields are left out of every listed product."""
+        create_product(name='Other product')
+
+        res = self.client.get(PRODUCTS_URL, {'omit': 'tags,thumbnail'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for item in res.data['results']:
+            self.assertEqual(list(item),
+                             ['id', 'name', 'price', 'types', 'resources'])
+
+    def test_nested_fields_not_trimmed(self):
+        """Test nested serializers keep their own fields."""
+        res = self.client.get(detail_url(self.product.id),
+                              {'fields': 'id,tags'})
+
+        self.assertEqual(list(res.data['tags'][0]), ['id', 'name'])
+
+    def test_unknown_field_rejected(self):
+        """Test asking for a field the endpoint doesn't have is an error."""
+        res = self.client.get(PRODUCTS_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_scalar_fields_skip_prefetches(self):
+        """Test relations left out of the fields aren't prefetched."""
+        with self.assertNumQueries(1):
+            res = self.client.get(PRODUCTS_URL, {'fields': 'id,name,price'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(2):
+            self.client.get(PRODUCTS_URL, {'fields': 'id,tags'})
+
+    def test_fields_narrow_columns(self):
+        """Test only the columns of the rendered fields are selected."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(self.product.id),
+                                  {'fields': 'id,name,rating'})
+
+        self.assertEqual(res.data['rating'], None)
+        sql = queries[0]['sql']
+        self.assertIn('"rating_avg"', sql)
+        for column in ('description', 'search_document', 'image_variants'):
+            self.assertNotIn(f'"{column}"', sql)
+
+    def test_full_payload_defers_unrendered_columns(self):
+        """Test columns no field renders aren't selected by default."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(PRODUCTS_URL)
+
+        self.assertNotIn('"search_document"', queries[0]['sql'])
+        self.assertNotIn('"description"', queries[0]['sql'])
+
+    def test_writes_ignore_fields(self):
+        """Test write responses render every field."""
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser('staff@example.com',
+                                                      'pass123')
+        )
+
+        res = self.client.patch(f'{detail_url(self.product.id)}?fields=id',
+                                {'name': 'New name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'New name')
+        self.assertIn('description', res.data)
+
+    def test_resource_and_tag_fields(self):
+        """Test resources and tags take the fields parameter too."""
+        resources = self.client.get(RESOURCES_URL, {'fields': 'name'})
+        tags = self.client.get(TAGS_URL, {'omit': 'id'})
+
+        self.assertEqual(list(resources.data['results'][0]), ['name'])
+        self.assertEqual(list(tags.data['results'][0]), ['name'])
+
+
+@override_settings(CATALOG_CACHE_TIMEOUT=0)
+class ExpandTests(TestCase):
+    """Test the expand query parameter."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+
+    def test_resources_rendered_as_keys_by_default(self):
+        """Test resources are primary keys unless expanded."""
+        res = self.client.get(detail_url(self.product.id))
+
+        self.assertEqual(res.data['resources'],
+                         [self.product.resources.get().id])
+
+    def test_expand_embeds_resources(self):
+        """Test expanded resources are embedded like the resource API."""
+        resource = self.product.resources.get()
+
+        res = self.client.get(detail_url(self.product.id),
+                              {'expand': 'resources'})
+        resource_res = self.client.get(
+            reverse('product:resource-detail', args=[resource.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['resources'], [resource_res.data])
+
+    def test_expanded_list_one_prefetch_per_relation(self):
+        """Test expanding costs the same queries for 1 and 10 products."""
+        for _ in range(9):
+            create_product(name='Other product')
+
+        with self.assertNumQueries(4):
+            res = self.client.get(PRODUCTS_URL,
+                                  {'expand': 'types,tags,resources'})
+
+        self.assertEqual(len(res.data['results']), 10)
+        for item in res.data['results']:
+            self.assertEqual(list(item['resources'][0]),
+                             ['id', 'name', 'price', 'image', 'image_status',
+                              'image_variants'])
+
+    def test_expand_with_fields(self):
+        """Test expanded relations combine with the fields parameter."""
+        with self.assertNumQueries(2):
+            res = self.client.get(detail_url(self.product.id),
+                                  {'fields': 'id,resources',
+                                   'expand': 'resources'})
+
+        self.assertEqual(list(res.data), ['id', 'resources'])
+        self.assertEqual(res.data['resources'][0]['name'],
+                         self.product.resources.get().name)
+
+    def test_unknown_expand_rejected(self):
+        """Test expanding a field that isn't a relation is an error."""
+        res = self.client.get(PRODUCTS_URL, {'expand': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', res.data)
@@ -52,10 +52,10 @@ class PublicTagAPITest(TestCase):
 
         res = self.client.get(TAGS_URL)
 
-        tags = Tag.objects.all().order_by('-name')
+        tags = Tag.objects.all().order_by('id')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_post_tag_fail(self):
         """Test unauthenticated users can't create tags."""
@@ -114,12 +114,12 @@ class PrivateTagAPITests(TestCase):
         Tag.objects.create(name='Set')
         Tag.objects.create(name='Azul')
 
-        tags = Tag.objects.all().order_by('-name')
+        tags = Tag.objects.all().order_by('id')
         serializer = TagSerializer(tags, many=True)
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_non_staff_delete_tag_error(self):
         """Test non-staff authenticated users deleting tag results in error."""
@@ -163,3 +163,26 @@ class PrivateTagAPITests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Tag.objecst.all().count(), 0)
+
+    def test_staff_create_tag_name_taken(self):
+        """Test creating a tag named like another, ignoring case, fails."""
+        Tag.objects.create(name='Playa')
+        _, staff_client = create_staff_client('staff@example.com')
+
+        res = staff_client.post(TAGS_URL, {'name': 'playa'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_staff_rename_tag_case(self):
+        """Test a tag can be renamed to another case of its own name."""
+        tag = Tag.objects.create(name='playa')
+        _, staff_client = create_staff_client('staff@example.com')
+
+        res = staff_client.patch(detail_url(tag.id), {'name': 'Playa'},
+                                 format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Playa')
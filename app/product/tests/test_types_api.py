@@ -53,10 +53,10 @@ class PublicProduct_typesApiTests(TestCase):
 
         res = self.client.get(PRODUCT_TYPES_URL)
 
-        product_types = Product_type.objects.all().order_by('-name')
+        product_types = Product_type.objects.all().order_by('id')
         serializer = Product_typeSerializer(product_types, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_unauthenticated_create_product_type_error(self):
         """Test unauthenticated users cany create product types."""
@@ -1,7 +1,15 @@
 """
 Views for the Product API.
 """
+from types import GeneratorType
+
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework import (
@@ -11,22 +19,68 @@ from rest_framework import (
 )
 
 from core.models import (
+    ImageStatus,
     Product,
     Product_type,
     Rating,
     Tag,
     Resource,
 )
+from core.db.routing import ReplicaReadMixin
+from core.timing import ServerTimingMixin
 from product import serializers
 
+from .async_views import AsyncCatalogReadMixin
+from .fieldsets import SparseFieldsetMixin
+from .filters import ProductFilter, ProductSearchFilter
+from .images import schedule_image_processing
+from .importer import ProductImporter
+from .pagination import CatalogCursorPagination
+from .parsers import NDJSONParser
+from .renderers import NDJSONRenderer, CSVRenderer, JSONArrayRenderer
+from .rows import ProductRowReadMixin, product_rows
 from .permissions import DenyPostPermission
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ServerTimingMixin, ReplicaReadMixin,
+                     AsyncCatalogReadMixin, ProductRowReadMixin,
+                     SparseFieldsetMixin, viewsets.ModelViewSet):
     """View for manage the product APIs."""
     serializer_class = serializers.ProductDetailSerializer
     queryset = Product.objects.all()
     permission_classes = [DenyPostPermission]
+    pagination_class = CatalogCursorPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
+    filterset_class = ProductFilter
+    cache_models = (Product, Product_type, Rating, Tag, Resource)
+    detail_cache_models = (Product_type, Tag, Resource)
+    max_import_chunk_size = 5000
+    export_chunk_size = 1000
+    relations = ('types', 'tags', 'resources')
+
+    def get_queryset(self):
+        """Return products with the columns and relations rendered."""
+        queryset = self.queryset
+        if self.action in ('list', 'retrieve', 'export'):
+            rendered = self.get_rendered_fields()
+            if self.renders_rows():
+                return product_rows(queryset, self.get_sparse_columns(),
+                                    [relation for relation in self.relations
+                                     if relation in rendered])
+
+            expanded = self.get_expanded_fields()
+            queryset = queryset.only(*self.get_sparse_columns())
+            for relation in self.relations:
+                if relation not in rendered:
+                    continue
+                if relation == 'resources' and relation not in expanded:
+                    # Only the primary keys are rendered.
+                    relation = Prefetch(relation, Resource.objects.only('id'))
+                queryset = queryset.prefetch_related(relation)
+        elif self.action in ('update', 'partial_update'):
+            queryset = queryset.prefetch_related(*self.relations)
+
+        return queryset
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
@@ -34,6 +88,10 @@ class ProductViewSet(viewsets.ModelViewSet):
             return serializers.ProductSerializer
         elif self.action == 'upload_image':
             return serializers.ProductImageSerializer
+        elif self.action == 'bulk_import':
+            return serializers.ProductImportSerializer
+        elif self.action == 'export':
+            return serializers.ProductDetailSerializer
 
         return self.serializer_class
 
@@ -44,13 +102,64 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(product, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            replaced = (product.image.name, product.image_variants)
+            serializer.save(image_status=ImageStatus.PENDING,
+                            image_variants={})
+            schedule_image_processing(product, replaced)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['POST'], detail=False, url_path='import',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk_import(self, request):
+        """Import products from a JSON array or an NDJSON stream."""
+        rows = request.data
+        if not isinstance(rows, (list, GeneratorType)):
+            return Response(
+                {'detail': 'Expected a list of products.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', 0))
+        except ValueError:
+            chunk_size = 0
+        chunk_size = min(max(chunk_size, 0), self.max_import_chunk_size)
+
+        report = ProductImporter(chunk_size=chunk_size).run(rows)
+        return Response(report, status=status.HTTP_200_OK)
 
-class Product_typeViewSet(mixins.ListModelMixin,
+    @action(methods=['GET'], detail=False, url_path='export',
+            renderer_classes=[NDJSONRenderer, CSVRenderer,
+                              JSONArrayRenderer])
+    def export(self, request):
+        """Stream the catalog as NDJSON, CSV or a JSON array.
+
+        Takes the filters of the list, without its pagination. Products
+        are read in chunks through a server-side cursor with their
+        relations prefetched per chunk, and each row is written out as
+        soon as it is serialized, so memory is bounded by the chunk size
+        whatever the number of products.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        serializer = self.get_serializer()
+        rows = (serializer.to_representation(product) for product
+                in queryset.iterator(chunk_size=self.export_chunk_size))
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(renderer.render_stream(rows),
+                                         content_type=renderer.media_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="products.{renderer.format}"'
+
+        return response
+
+
+class Product_typeViewSet(ServerTimingMixin, ReplicaReadMixin,
+                          AsyncCatalogReadMixin,
+                          mixins.ListModelMixin,
+                          mixins.RetrieveModelMixin,
                           mixins.CreateModelMixin,
                           mixins.UpdateModelMixin,
                           mixins.DestroyModelMixin,
@@ -59,14 +168,12 @@ class Product_typeViewSet(mixins.ListModelMixin,
     serializer_class = serializers.Product_typeSerializer
     queryset = Product_type.objects.all()
     permission_classes = [DenyPostPermission]
-
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+    pagination_class = CatalogCursorPagination
+    cache_models = (Product_type,)
 
 
-class RatingViewSet(mixins.ListModelMixin,
+class RatingViewSet(ServerTimingMixin, ReplicaReadMixin,
+                    mixins.ListModelMixin,
                     mixins.CreateModelMixin,
                     mixins.UpdateModelMixin,
                     viewsets.GenericViewSet):
@@ -74,20 +181,95 @@ class RatingViewSet(mixins.ListModelMixin,
     serializer_class = serializers.RatingSerializer
     queryset = Rating.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogCursorPagination
+    max_bulk_ratings = 1000
+
+    def get_serializer_class(self):
+        """Return the serializer class for request."""
+        if self.action in ('create', 'bulk_rate'):
+            return serializers.RatingSubmitSerializer
+
+        return self.serializer_class
+
+    def _upsert(self, values):
+        """Upsert the ratings of the user and return the written ones."""
+        try:
+            created = Rating.objects.upsert_for_user(self.request.user, values)
+        except Product.DoesNotExist as exc:
+            raise ValidationError({'product': [str(exc)]})
+
+        ratings = (Rating.objects.filter(user=self.request.user,
+                                         product_id__in=values)
+                   .order_by('product_id'))
+        return ratings, created
+
+    def create(self, request, *args, **kwargs):
+        """Rate a product, replacing the previous rating of the user."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
 
+        ratings, created = self._upsert(
+            {product: serializer.validated_data['value']}
+        )
+        return Response(
+            serializers.RatingSerializer(ratings[0]).data,
+            status=(status.HTTP_201_CREATED if created[product]
+                    else status.HTTP_200_OK),
+        )
 
-class TagViewSet(viewsets.ModelViewSet):
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_rate(self, request):
+        """Rate many products at once from a list of {product, value}.
+
+        Later items win over earlier ones for the same product.
+        """
+        if (isinstance(request.data, list)
+                and len(request.data) > self.max_bulk_ratings):
+            return Response(
+                {'detail': f'Expected at most {self.max_bulk_ratings} '
+                           f'ratings.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        ratings, _ = self._upsert({item['product']: item['value']
+                                   for item in serializer.validated_data})
+        return Response(
+            serializers.RatingSerializer(ratings, many=True).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class TagViewSet(ServerTimingMixin, ReplicaReadMixin,
+                 AsyncCatalogReadMixin, SparseFieldsetMixin,
+                 viewsets.ModelViewSet):
     """Manage Tags in database."""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
     permission_classes = [DenyPostPermission]
+    pagination_class = CatalogCursorPagination
+    cache_models = (Tag,)
 
 
-class ResourceViewSet(viewsets.ModelViewSet):
+class ResourceViewSet(ServerTimingMixin, ReplicaReadMixin,
+                      AsyncCatalogReadMixin, SparseFieldsetMixin,
+                      viewsets.ModelViewSet):
     """Manage resources in database."""
     serializer_class = serializers.ResourceSerializer
     queryset = Resource.objects.all()
     permission_classes = [DenyPostPermission]
+    pagination_class = CatalogCursorPagination
+    cache_models = (Resource,)
+
+    def get_queryset(self):
+        """Return resources with the columns the action renders."""
+        if self.action in ('list', 'retrieve'):
+            return self.queryset.only(*self.get_sparse_columns())
+
+        return self.queryset
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
@@ -103,7 +285,10 @@ class ResourceViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(resource, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            replaced = (resource.image.name, resource.image_variants)
+            serializer.save(image_status=ImageStatus.PENDING,
+                            image_variants={})
+            schedule_image_processing(resource, replaced)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,128 @@
+"""
+Authentication for the API.
+"""
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.caching import is_process_local
+from core.metrics import auth_failures_total, cache_requests_total
+
+
+TOKEN_CACHE_KEY = 'auth-token:{}'
+
+
+class TokenUserLRU:
+    """Thread-safe LRU of token keys to users, with a TTL per entry."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the user of a token, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+
+        return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = TokenUserLRU(settings.TOKEN_CACHE_SIZE,
+                            settings.TOKEN_CACHE_LOCAL_TTL)
+
+
+def _forget(keys):
+    for key in keys:
+        local_tokens.discard(key)
+    cache.delete_many([TOKEN_CACHE_KEY.format(key) for key in keys])
+
+
+def invalidate_tokens(*keys):
+    """Forget the cached users of the given token keys.
+
+    Done again once the current transaction commits, so a concurrent
+    request can't keep the pre-commit user cached.
+    """
+    _forget(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _forget(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication resolving tokens from a cache.
+
+    Users are looked up in a process-local LRU first, then in the shared
+    cache, and only then in the database. Entries are dropped by the
+    `user.signals` receivers when a token is deleted or regenerated and
+    when its user changes; the local LRU of other processes catches up
+    within TOKEN_CACHE_LOCAL_TTL seconds.
+
+    A process-local cache backend, such as the default LocMem, can't be
+    invalidated across processes, so it isn't used as the second layer:
+    only the LRU, and its TOKEN_CACHE_LOCAL_TTL bound, are left.
+    """
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except exceptions.AuthenticationFailed:
+            auth_failures_total.labels('token').inc()
+            raise
+
+    def authenticate_credentials(self, key):
+        user = local_tokens.get(key)
+        cache_requests_total.labels(
+            'auth-token-local', 'miss' if user is None else 'hit',
+        ).inc()
+        if user is None:
+            shared = not is_process_local()
+            if shared:
+                user = cache.get(TOKEN_CACHE_KEY.format(key))
+                cache_requests_total.labels(
+                    'auth-token', 'miss' if user is None else 'hit',
+                ).inc()
+            if user is None:
+                user, _ = super().authenticate_credentials(key)
+                if shared:
+                    cache.set(TOKEN_CACHE_KEY.format(key), user,
+                              settings.TOKEN_CACHE_TTL)
+            local_tokens.set(key, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        # Requests may change their user, never share the cached instance.
+        user = copy.copy(user)
+        return (user, user.auth_token)
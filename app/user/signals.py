@@ -0,0 +1,37 @@
+"""
+Signal receivers of the user app.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.metrics import auth_failures_total
+from user.authentication import invalidate_tokens
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Drop a deleted or regenerated token from the token cache."""
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens of a changed user."""
+    if created:
+        return
+
+    keys = list(Token.objects.filter(user=instance)
+                .values_list('key', flat=True))
+    if keys:
+        invalidate_tokens(*keys)
+
+
+@receiver(user_login_failed)
+def count_login_failure(sender, credentials, **kwargs):
+    """Count the failed logins with an email and password."""
+    auth_failures_total.labels('credentials').inc()
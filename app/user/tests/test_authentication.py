@@ -0,0 +1,118 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import local_tokens
+
+
+ME_URL = reverse('user:me')
+PRODUCTS_URL = reverse('product:product-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token authentication served from the token cache."""
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_database(self):
+        """Test an already seen token is authenticated without queries."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    @patch('user.authentication.is_process_local', return_value=False)
+    def test_shared_cache_fills_local_cache(self, patched_local):
+        """Test a token known to the shared cache needs no query."""
+        self.client.get(ME_URL)
+        local_tokens.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_local_cache_revocation_bound(self):
+        """Test a process-local backend only keeps users in the LRU.
+
+        A write made elsewhere, which invalidates the caches of its own
+        process only, is seen within TOKEN_CACHE_LOCAL_TTL seconds.
+        """
+        self.client.get(ME_URL)
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            is_active=False,
+        )
+
+        later = time.monotonic() + local_tokens.ttl + 1
+        with patch('user.authentication.time.monotonic',
+                   return_value=later):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating at once."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user stops authenticating at once."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_change_applies_to_permissions(self):
+        """Test a staff flag change is seen by the permission checks."""
+        payload = {'name': 'Product', 'price': '10.00'}
+        res = self.client.post(PRODUCTS_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.post(PRODUCTS_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.user.is_staff = False
+        self.user.save()
+        res = self.client.post(PRODUCTS_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_profile_update_refreshes_cached_user(self):
+        """Test the cached user follows updates of the profile."""
+        self.client.patch(ME_URL, {'name': 'New Name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New Name')